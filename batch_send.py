@@ -0,0 +1,190 @@
+import ctypes
+import errno
+import socket
+import sys
+
+# sendmmsg(2) gửi cả loạt datagram trong một syscall; Python không có sẵn nên gọi qua ctypes (chỉ Linux)
+MMSG_BATCH = 1024  # UIO_MAXIOV: số message tối đa mỗi lần gọi
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_ubyte * 4),
+        ("sin_zero", ctypes.c_ubyte * 8),
+    ]
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        function = ctypes.CDLL(None, use_errno=True).sendmmsg
+    except (OSError, AttributeError):
+        return None
+    function.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    function.restype = ctypes.c_int
+    return function
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+def sendmmsg_available():
+    return _sendmmsg is not None
+
+
+class BatchSender:
+    """A fixed list of IPv4 recipients that one datagram can be sent to in as few syscalls as possible.
+
+    With sendmmsg the message headers and addresses are prepared once, so a
+    send only points the shared iovec at the payload. Elsewhere it falls back
+    to one sendto per recipient.
+    """
+
+    def __init__(self, addresses, use_sendmmsg=True):
+        self.addresses = tuple(addresses)
+        self.index = {address: i for i, address in enumerate(self.addresses)}
+        self.batched = use_sendmmsg and _sendmmsg is not None
+        if not self.batched:
+            return
+
+        count = len(self.addresses)
+        self.names = (_SockAddrIn * count)()
+        self.iov = _IOVec()
+        self.messages = (_MMsgHdr * count)()
+        iov_pointer = ctypes.pointer(self.iov)
+        for i, (host, port) in enumerate(self.addresses):
+            name = self.names[i]
+            name.sin_family = socket.AF_INET
+            name.sin_port = socket.htons(port)
+            name.sin_addr[:] = socket.inet_aton(host)
+            header = self.messages[i].msg_hdr
+            header.msg_name = ctypes.addressof(name)
+            header.msg_namelen = ctypes.sizeof(_SockAddrIn)
+            header.msg_iov = iov_pointer
+            header.msg_iovlen = 1
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def send(self, sock, data, skip=None):
+        """Send `data` to every recipient except `skip`; returns (sent, failed addresses, syscalls)"""
+        skipped = self.index.get(skip)
+        if skipped is None:
+            segments = [(0, len(self.addresses))]
+        else:
+            segments = [(0, skipped), (skipped + 1, len(self.addresses))]
+        if not self.batched:
+            return self._send_each(sock, data, segments)
+
+        # Giữ tham chiếu tới buffer trong suốt lời gọi
+        buffer = ctypes.c_char_p(data)
+        self.iov.iov_base = ctypes.cast(buffer, ctypes.c_void_p)
+        self.iov.iov_len = len(data)
+        base = ctypes.addressof(self.messages)
+        size = ctypes.sizeof(_MMsgHdr)
+        fd = sock.fileno()
+
+        sent = 0
+        failed = []
+        syscalls = 0
+        for start, end in segments:
+            while start < end:
+                result = _sendmmsg(fd, base + start * size, min(end - start, MMSG_BATCH), 0)
+                syscalls += 1
+                if result > 0:
+                    sent += result
+                    start += result
+                    continue
+                if result < 0 and ctypes.get_errno() == errno.EINTR:
+                    continue
+                # Message tại `start` gửi lỗi: bỏ qua nó và gửi tiếp phần còn lại
+                failed.append(self.addresses[start])
+                start += 1
+        return sent, failed, syscalls
+
+    def _send_each(self, sock, data, segments):
+        sendto = sock.sendto
+        addresses = self.addresses
+        sent = 0
+        failed = []
+        syscalls = 0
+        for start, end in segments:
+            for i in range(start, end):
+                syscalls += 1
+                try:
+                    sendto(data, addresses[i])
+                    sent += 1
+                except OSError:
+                    failed.append(addresses[i])
+        return sent, failed, syscalls
+
+
+def send_many(sock, datagrams, address, use_sendmmsg=True):
+    """Send several datagrams to one IPv4 recipient; returns (sent, syscalls)"""
+    if not datagrams:
+        return 0, 0
+    if not use_sendmmsg or _sendmmsg is None:
+        sent = 0
+        for datagram in datagrams:
+            try:
+                sock.sendto(datagram, address)
+            except OSError:
+                return sent, sent + 1
+            sent += 1
+        return sent, sent
+
+    count = len(datagrams)
+    name = _SockAddrIn()
+    name.sin_family = socket.AF_INET
+    name.sin_port = socket.htons(address[1])
+    name.sin_addr[:] = socket.inet_aton(address[0])
+    buffers = [ctypes.c_char_p(datagram) for datagram in datagrams]  # Giữ tham chiếu trong suốt lời gọi
+    iovs = (_IOVec * count)()
+    messages = (_MMsgHdr * count)()
+    for i, datagram in enumerate(datagrams):
+        iovs[i].iov_base = ctypes.cast(buffers[i], ctypes.c_void_p)
+        iovs[i].iov_len = len(datagram)
+        header = messages[i].msg_hdr
+        header.msg_name = ctypes.addressof(name)
+        header.msg_namelen = ctypes.sizeof(_SockAddrIn)
+        header.msg_iov = ctypes.pointer(iovs[i])
+        header.msg_iovlen = 1
+
+    base = ctypes.addressof(messages)
+    size = ctypes.sizeof(_MMsgHdr)
+    fd = sock.fileno()
+    start = 0
+    syscalls = 0
+    while start < count:
+        result = _sendmmsg(fd, base + start * size, min(count - start, MMSG_BATCH), 0)
+        syscalls += 1
+        if result > 0:
+            start += result
+        elif result < 0 and ctypes.get_errno() == errno.EINTR:
+            continue
+        else:
+            break  # Cùng một người nhận: lỗi ở một message thì phần còn lại cũng sẽ lỗi
+    return start, syscalls
@@ -0,0 +1,708 @@
+"""Micro-benchmarks for the Football Hub server.
+
+Chạy: python benchmark.py <tên benchmark>  (xem python benchmark.py -h)
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------- Helpers ----------
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, samples_ms):
+    print(f"{name:<28} p50={percentile(samples_ms, 50):8.3f} ms  "
+          f"p99={percentile(samples_ms, 99):8.3f} ms  mean={statistics.mean(samples_ms):8.3f} ms")
+
+
+def sample_matches(count=380):
+    """Build a matches payload shaped like football-data.org's /matches"""
+    matches = []
+    for i in range(count):
+        matches.append({
+            "area": {"id": 2072, "name": "England", "code": "ENG", "flag": "https://crests.football-data.org/770.svg"},
+            "competition": {"id": 2021, "name": "Premier League", "code": "PL", "type": "LEAGUE",
+                            "emblem": "https://crests.football-data.org/PL.png"},
+            "season": {"id": 2287, "startDate": "2025-08-15", "endDate": "2026-05-24", "currentMatchday": 9},
+            "id": 537000 + i,
+            "utcDate": f"2026-10-{1 + i % 28:02d}T{12 + i % 8:02d}:30:00Z",
+            "status": ["SCHEDULED", "TIMED", "IN_PLAY", "FINISHED"][i % 4],
+            "matchday": 1 + i // 10,
+            "stage": "REGULAR_SEASON",
+            "lastUpdated": "2026-10-17T08:20:04Z",
+            "homeTeam": {"id": 57 + i % 20, "name": f"Home Team {i % 20} FC", "shortName": f"Home {i % 20}",
+                         "tla": "HOM", "crest": f"https://crests.football-data.org/{57 + i % 20}.png"},
+            "awayTeam": {"id": 77 + i % 20, "name": f"Away Team {i % 20} FC", "shortName": f"Away {i % 20}",
+                         "tla": "AWY", "crest": f"https://crests.football-data.org/{77 + i % 20}.png"},
+            "score": {"winner": None, "duration": "REGULAR",
+                      "fullTime": {"home": i % 4, "away": i % 3},
+                      "halfTime": {"home": i % 2, "away": 0}},
+            "odds": {"msg": "Activate Odds-Package in User-Panel to retrieve odds."},
+            "referees": [{"id": 11580 + i, "name": "Referee Name", "type": "REFEREE", "nationality": "England"}],
+        })
+    return {"filters": {"season": "2025"}, "resultSet": {"count": count}, "matches": matches}
+
+
+def sample_team_ref(i):
+    return {"id": 57 + i, "name": f"Team {i} Football Club", "shortName": f"Team {i}", "tla": "TMX",
+            "crest": f"https://crests.football-data.org/{57 + i}.png"}
+
+
+def sample_standings():
+    """/competitions/{id}/standings: TOTAL, HOME and AWAY tables of 20 teams"""
+    tables = []
+    for kind in ("TOTAL", "HOME", "AWAY"):
+        table = [{"position": i + 1, "team": sample_team_ref(i), "playedGames": 9, "form": "W,D,L,W,W",
+                  "won": 6, "draw": 2, "lost": 1, "points": 20, "goalsFor": 18, "goalsAgainst": 7,
+                  "goalDifference": 11} for i in range(20)]
+        tables.append({"stage": "REGULAR_SEASON", "type": kind, "group": None, "table": table})
+    return {"competition": {"id": 2021, "name": "Premier League"}, "standings": tables}
+
+
+def sample_scorers(count=100):
+    """/competitions/{id}/scorers"""
+    return {"count": count, "scorers": [
+        {"player": {"id": 8000 + i, "name": f"Player Number {i}", "firstName": "Player", "lastName": f"Number {i}",
+                    "dateOfBirth": "1998-04-12", "nationality": "England", "section": "Offence",
+                    "position": "Centre-Forward", "shirtNumber": 9, "lastUpdated": "2026-10-01T08:00:00Z"},
+         "team": sample_team_ref(i % 20), "playedMatches": 9, "goals": 12 - i % 12, "assists": i % 5,
+         "penalties": i % 3} for i in range(count)]}
+
+
+def sample_team():
+    """/teams/{id} with a full squad"""
+    team = sample_team_ref(0)
+    team.update({"area": {"id": 2072, "name": "England"}, "address": "75 Drayton Park London N5 1BU",
+                 "website": "http://www.arsenal.com", "founded": 1886, "clubColors": "Red / White",
+                 "venue": "Emirates Stadium", "coach": {"id": 11619, "name": "Coach Name"},
+                 "squad": [{"id": 3000 + i, "name": f"Squad Player {i}", "position": "Midfield",
+                            "dateOfBirth": "1999-01-01", "nationality": "Spain"} for i in range(30)]})
+    return team
+
+
+def sample_person():
+    """/persons/{id}"""
+    return {"id": 44, "name": "Player Number 1", "firstName": "Player", "lastName": "Number 1",
+            "dateOfBirth": "1998-04-12", "nationality": "England", "position": "Offence", "shirtNumber": 9,
+            "currentTeam": dict(sample_team_ref(1), contract={"start": "2023-07", "until": "2028-06"})}
+
+
+# ---------- Upstream HTTP ----------
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Cho phép keep-alive
+    disable_nagle_algorithm = True
+    body = b"{}"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(body):
+    """Serve `body` for every GET on a local port; returns (server, base_url)"""
+    handler = type("StubHandler", (_StubHandler,), {"body": body})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_http(args):
+    import requests
+    from http_pool import PooledSession
+
+    server, base_url = start_stub_server(json.dumps(sample_matches(50)).encode())
+    url = f"{base_url}/v4/competitions/2021/standings"
+
+    def run(get):
+        samples = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            get(url).content
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    report("requests.get (no pooling)", run(requests.get))
+    session = PooledSession()
+    report("PooledSession", run(session.get))
+    print("connection reuse:", session.stats())
+    session.close()
+    server.shutdown()
+
+
+# ---------- TCP Server ----------
+def _quiet_server(latency_ms, payload):
+    """Import server with upstream replaced by a fixed-latency stub and logging silenced"""
+    import server
+
+    def fake_fetch(url, priority=None, wait=None):
+        time.sleep(latency_ms / 1000)
+        return payload
+
+    server.fetch_json = fake_fetch
+    server.log_debug = lambda message: None
+    server.print = lambda *a, **k: None
+    server.CACHE_TTL = dict.fromkeys(server.CACHE_TTL, 0)  # Mọi request đều "gọi upstream"
+    return server
+
+
+def _open_idle(port, count):
+    import socket
+    conns = []
+    for _ in range(count):
+        conns.append(socket.create_connection(("127.0.0.1", port)))
+    return conns
+
+
+def _connection_threads():
+    """Threads the server runs per client connection (handler and push threads)"""
+    return sum(1 for thread in threading.enumerate() if thread.name.startswith(("client-", "push-")))
+
+
+def bench_tcp(args):
+    import socket
+    from protocol import FrameReader, send_frame, MSG_REQUEST
+
+    server = _quiet_server(args.latency, sample_matches(20))
+    modes = [("threaded", server.run_server, 0), ("asyncio", server.run_async_server, 1)]
+    for name, runner, offset in modes:
+        port = args.port + offset
+        threading.Thread(target=runner, args=("127.0.0.1", port), daemon=True).start()
+        time.sleep(0.3)
+
+        idle = _open_idle(port, args.idle)
+        time.sleep(0.5)
+        threads = _connection_threads()
+
+        samples = []
+        lock = threading.Lock()
+
+        def client(worker):
+            sock = socket.create_connection(("127.0.0.1", port))
+            reader = FrameReader(sock)
+            local = []
+            for i in range(args.requests):
+                start = time.perf_counter()
+                send_frame(sock, f"team {worker * 100000 + i}".encode(), i + 1, MSG_REQUEST)
+                reader.read_frame()
+                local.append((time.perf_counter() - start) * 1000)
+            sock.close()
+            with lock:
+                samples.extend(local)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=client, args=(w,)) for w in range(args.clients)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        report(f"{name} ({args.idle} idle)", samples)
+        print(f"{'':<28} {len(samples) / elapsed:8.1f} req/s, per-connection server threads: {threads}")
+        for conn in idle:
+            conn.close()
+        # Chờ thread của chế độ này thoát hết để không lẫn vào số đo của chế độ sau
+        deadline = time.monotonic() + 5
+        while _connection_threads() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+# ---------- Response Encoding ----------
+def bench_encode(args):
+    server = _quiet_server(0, sample_matches(380))
+    server.CACHE_TTL["matches"] = 3600  # Response nằm sẵn trong cache như lúc tải cao
+    command = b"matches 2021 30"
+    server.process_request(command)
+
+    def run(label):
+        started = time.process_time()
+        for _ in range(args.requests):
+            _, body, _ = server.process_request(command)
+        per_response = (time.process_time() - started) / args.requests * 1000
+        print(f"{label:<28} {per_response:8.3f} ms CPU/response  ({len(body)} bytes)")
+
+    encode = server.encoded_responses.encode
+    server.encoded_responses.encode = lambda key, data, encoder: encoder(data)
+    run("json.dumps per request")
+    server.encoded_responses.encode = encode
+    run("pre-serialized bytes")
+
+
+# ---------- Request Coalescing ----------
+def bench_coalesce(args):
+    server = _quiet_server(args.latency, sample_matches(380))
+    fetch = server.fetch_json
+    upstream_calls = []
+
+    def counting_fetch(url, priority=None, wait=None):
+        upstream_calls.append(url)
+        return fetch(url, priority, wait)
+
+    server.fetch_json = counting_fetch
+    rounds = max(1, args.requests // args.clients)
+    samples = []
+    lock = threading.Lock()
+
+    # Mỗi vòng: `clients` thread gửi cùng một lệnh gần như đồng thời, như lúc trận đấu bắt đầu
+    for _ in range(rounds):
+        barrier = threading.Barrier(args.clients)
+
+        def client():
+            barrier.wait()
+            started = time.perf_counter()
+            server.process_request(b"matches 2021 1 view=slim")
+            with lock:
+                samples.append((time.perf_counter() - started) * 1000)
+
+        workers = [threading.Thread(target=client) for _ in range(args.clients)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+    report(f"{args.clients} identical requests", samples)
+    print(f"upstream calls: {len(upstream_calls)} for {len(samples)} requests")
+    print("coalescing:", server.command_flights.stats())
+
+
+# ---------- UDP Chat Relay ----------
+def _udp_peers(count):
+    import socket
+    peers = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.setblocking(False)
+        peers.append(sock)
+    return peers
+
+
+def _drain(peers, on_datagram, stop):
+    """Read every peer socket until `stop` is set, calling on_datagram(data) for each datagram"""
+    import selectors
+    selector = selectors.DefaultSelector()
+    for sock in peers:
+        selector.register(sock, selectors.EVENT_READ)
+    while not stop.is_set():
+        for key, _ in selector.select(timeout=0.1):
+            while True:
+                try:
+                    data = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    break
+                on_datagram(data)
+    selector.close()
+
+
+def bench_udp(args):
+    from chat_relay import (ChatRelay, encode_datagram, decode_datagram, match_room,
+                            KIND_JOIN, KIND_LEAVE, KIND_MSG, GLOBAL_ROOM)
+
+    for index, count in enumerate(int(n) for n in args.peers.split(",")):
+        relay = ChatRelay("127.0.0.1", args.port + index, log=lambda message: None, batch_sends=not args.sendto)
+        # CPU (user + kernel) mà thread relay tốn cho mỗi lần fan-out
+        fanout_cpu = [0.0]
+        fanout = relay.fanout
+
+        def timed_fanout(data, sender, recipients):
+            started = time.thread_time()
+            fanout(data, sender, recipients)
+            fanout_cpu[0] += time.thread_time() - started
+
+        relay.fanout = timed_fanout
+        threading.Thread(target=relay.serve_forever, daemon=True).start()
+        peers = _udp_peers(count)
+        # PING theo từng đợt nhỏ để không tràn buffer nhận của relay
+        for start in range(0, count, 100):
+            while relay.stats()["peers"] < min(start + 100, count):
+                for sock in peers[start:start + 100]:
+                    sock.sendto(b"PING|bench", relay.address)
+                time.sleep(0.05)
+
+        # --rooms N: mỗi peer chỉ ở trong một phòng trận đấu, tin nhắn gửi vào phòng của peer đầu tiên
+        room = GLOBAL_ROOM
+        expected = count - 1
+        if args.rooms:
+            room = match_room(0)
+            expected = len(range(0, count, args.rooms)) - 1
+            for start in range(0, count, 100):
+                for i in range(start, min(start + 100, count)):
+                    peers[i].sendto(encode_datagram(KIND_JOIN, match_room(i % args.rooms)), relay.address)
+                    peers[i].sendto(encode_datagram(KIND_LEAVE, GLOBAL_ROOM), relay.address)
+                time.sleep(0.05)
+            while len(relay.rooms.get(room, ())) < expected + 1:
+                time.sleep(0.05)
+
+        # Mỗi tin nhắn mang số thứ tự; đo tới lúc người nhận cuối cùng nhận được
+        received = {}
+        done = threading.Event()
+        current = [None]
+
+        def on_datagram(data):
+            kind, _, body = decode_datagram(data)
+            if kind != KIND_MSG:
+                return  # JOINED và các gói điều khiển khác
+            seq = int(body.split(b"|", 2)[1])
+            received[seq] = received.get(seq, 0) + 1
+            if seq == current[0] and received[seq] >= expected:
+                done.set()
+
+        stop = threading.Event()
+        drainer = threading.Thread(target=_drain, args=(peers[1:], on_datagram, stop), daemon=True)
+        drainer.start()
+
+        messages = min(args.requests, max(5, 100000 // count))
+        samples = []
+        lost = 0
+        started = time.perf_counter()
+        for seq in range(messages):
+            done.clear()
+            current[0] = seq
+            sent_at = time.perf_counter()
+            peers[0].sendto(encode_datagram(KIND_MSG, room, f"MSG|{seq}|hello from the load generator".encode()),
+                            relay.address)
+            if not done.wait(5):
+                lost += expected - received.get(seq, 0)
+            samples.append((time.perf_counter() - sent_at) * 1000)
+        elapsed = time.perf_counter() - started
+        relay_cpu = fanout_cpu[0]
+        stop.set()
+        drainer.join()
+
+        report(f"{count} peers fan-out" + (f" ({args.rooms} rooms)" if args.rooms else ""), samples)
+        print(f"{'':<28} {messages / elapsed:8.1f} msg/s, {relay.stats()['relayed'] / elapsed:10.0f} datagrams/s, "
+              f"lost={lost}, {relay.stats()['syscalls_per_message']} syscalls/msg, "
+              f"relay CPU {relay_cpu / messages * 1000:.3f} ms/msg")
+        for sock in peers:
+            sock.close()
+
+
+class _LossySocket:
+    """Wraps a UDP socket: drops or reorders outgoing datagrams to exercise the reliable chat channel"""
+
+    def __init__(self, sock, loss=0.0, reorder=0.0, drop_first_data=False, swap_first_data=False,
+                 drop_data_seq=None, seed=1):
+        import random
+        self.sock = sock
+        self.loss = loss
+        self.reorder = reorder
+        self.drop_first_data = drop_first_data
+        self.swap_first_data = swap_first_data
+        self.drop_data_seq = drop_data_seq  # Seq DATA bị mất ở mọi lần gửi: người gửi sẽ phải bỏ nó
+        self.random = random.Random(seed)
+        self.held = None
+        self.lock = threading.Lock()
+
+    def sendto(self, data, address):
+        from chat_relay import decode_datagram, KIND_DATA, DATA_HEADER
+        with self.lock:
+            if data[:1] == b"\xff" and decode_datagram(data)[0] == KIND_DATA:
+                if DATA_HEADER.unpack_from(decode_datagram(data)[2])[0] == self.drop_data_seq:
+                    return len(data)
+                if self.drop_first_data:
+                    self.drop_first_data = False
+                    return len(data)
+                if self.swap_first_data:
+                    # Giữ datagram DATA đầu tiên lại, gửi nó sau datagram kế tiếp
+                    self.swap_first_data = False
+                    self.held = (data, address)
+                    return len(data)
+            if self.random.random() < self.loss:
+                return len(data)
+            if self.held is None and self.random.random() < self.reorder:
+                self.held = (data, address)
+                return len(data)
+            held, self.held = self.held, None
+        result = self.sock.sendto(data, address)
+        if held is not None:
+            self.sock.sendto(*held)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def bench_reliable(args):
+    import chat_relay
+    from chat_relay import ChatRelay, ChatPeer, match_room, fragment
+
+    scenarios = {
+        "first DATA lost": {"drop_first_data": True},
+        "first two DATA reordered": {"swap_first_data": True},
+        "SACKed DATA past a lost seq": {"drop_data_seq": 5},
+        f"{args.loss:.0%} loss + 10% reorder": {"loss": args.loss, "reorder": 0.1},
+    }
+    count = max(10, args.requests // 5)
+    room = match_room(1)
+    for name, lossy in scenarios.items():
+        # sendto từng datagram (không sendmmsg) để chiều relay -> người nhận cũng đi qua _LossySocket
+        relay = ChatRelay("127.0.0.1", 0, log=lambda message: None, batch_sends=False)
+        if "loss" in lossy:
+            relay.sock = _LossySocket(relay.sock, lossy["loss"], lossy["reorder"], seed=7)
+        threading.Thread(target=relay.serve_forever, daemon=True).start()
+
+        received = [[], [], []]
+        peers = []
+        for i in range(3):
+            peer = ChatPeer(relay.address, on_message=lambda _, body, i=i: received[i].append(body))
+            # Chỉ người gửi đầu tiên mất seq drop_data_seq
+            peer.sock = _LossySocket(peer.sock, seed=i, **(lossy if i == 0 else
+                                                           {k: v for k, v in lossy.items() if k != "drop_data_seq"}))
+            peer.start()
+            peer.join(room)
+            peers.append(peer)
+        while any(room not in peer.inbound for peer in peers):
+            time.sleep(0.05)
+
+        # Hai người gửi xen kẽ, cứ tin nhắn thứ 10 thì lớn (nhiều mảnh)
+        sent = []
+        started = time.perf_counter()
+        for n in range(count):
+            body = b"%d|" % n + (b"x" * 5000 if n % 10 == 0 else b"hello")
+            while not peers[n % 2].send(room, body):
+                time.sleep(0.01)
+            sent.append(body)
+        lost = set()
+        if "drop_data_seq" in lossy:
+            # Tin nhắn chứa seq bị mất không bao giờ tới; các tin đã SACK sau nó vẫn phải tới.
+            # Bớt lượt gửi lại cho nhanh, chờ người gửi bỏ seq đó rồi gửi thêm một tin mang base mới
+            seq = 0
+            for body in sent[::2]:
+                if seq <= lossy["drop_data_seq"] < seq + len(fragment(body)):
+                    lost.add(body)
+                seq += len(fragment(body))
+            attempts, chat_relay.MAX_ATTEMPTS = chat_relay.MAX_ATTEMPTS, 3
+            while not peers[0].failed:
+                time.sleep(0.05)
+            chat_relay.MAX_ATTEMPTS = attempts
+            body = b"%d|after the gap" % (count + count % 2)
+            peers[0].send(room, body)
+            sent.append(body)
+        expected = [body for body in sent if body not in lost]
+        deadline = time.monotonic() + 60
+        while any(len(r) < len(expected) for r in received) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        same_order = received[0] == received[1] == received[2]
+        sender_order = all([b for b in received[2] if int(b.split(b"|")[0]) % 2 == s] ==
+                           [b for b in expected if int(b.split(b"|")[0]) % 2 == s] for s in (0, 1))
+        ok = same_order and sender_order and all(sorted(r) == sorted(expected) for r in received)
+        print(f"{name:<28} {'PASS' if ok else 'FAIL'}  delivered={[len(r) for r in received]}/{len(expected)} "
+              f"same order={same_order} sender order={sender_order} in {elapsed:.2f}s")
+        print(f"{'':<28} relay: duplicates={relay.duplicates} retransmitted={relay.retransmitted}; "
+              f"peers retransmitted={[peer.retransmitted for peer in peers]} failed={[peer.failed for peer in peers]}")
+        for peer in peers:
+            peer.close()
+
+
+# ---------- Payload Compression ----------
+def bench_compress(args):
+    import socket
+    from protocol import FrameReader, send_frame, decompress, available_codecs, MSG_REQUEST
+
+    server = _quiet_server(0, sample_matches(380))
+    server.CACHE_TTL["matches"] = 3600
+    threading.Thread(target=server.run_server, args=("127.0.0.1", args.port), daemon=True).start()
+    time.sleep(0.3)
+
+    for codec in ["none"] + available_codecs():
+        sock = socket.create_connection(("127.0.0.1", args.port))
+        reader = FrameReader(sock)
+        send_frame(sock, f"hello {codec}".encode(), 1, MSG_REQUEST)
+        reader.read_frame()
+
+        samples = []
+        wire_bytes = 0
+        for i in range(args.requests):
+            start = time.perf_counter()
+            send_frame(sock, b"matches 2021 30", i + 2, MSG_REQUEST)
+            _, _, flags, payload = reader.read_frame()
+            json.loads(decompress(flags, payload))
+            samples.append((time.perf_counter() - start) * 1000)
+            wire_bytes = len(payload)
+        sock.close()
+        report(f"{codec} ({wire_bytes} bytes)", samples)
+
+
+# ---------- Wire Formats ----------
+def bench_serialize(args):
+    from protocol import available_formats, encode_payload, decode_payload, WIRE_FORMAT_IDS
+    from projection import SLIM_VIEWS, project
+
+    payloads = {
+        "matches": sample_matches(380),
+        "standings": sample_standings(),
+        "scorers": sample_scorers(),
+        "team": sample_team(),
+        "player": sample_person(),
+    }
+    runs = max(1, args.requests // 10)
+    for command, full in payloads.items():
+        for view, data in (("full", full), ("slim", project(full, SLIM_VIEWS[command]))):
+            for wire_format in available_formats():
+                started = time.perf_counter()
+                for _ in range(runs):
+                    body = encode_payload(wire_format, data)
+                encode_ms = (time.perf_counter() - started) / runs * 1000
+
+                flags = WIRE_FORMAT_IDS[wire_format]
+                started = time.perf_counter()
+                for _ in range(runs):
+                    decode_payload(flags, body)
+                decode_ms = (time.perf_counter() - started) / runs * 1000
+                print(f"{command:<10} {view:<5} {wire_format:<8} {len(body):>8} bytes  "
+                      f"encode={encode_ms:7.3f} ms  decode={decode_ms:7.3f} ms")
+
+
+def bench_store(args):
+    import tracemalloc
+    from modern_theme import COMPETITIONS
+    from store import FootballStore, STATUS_GROUPS
+
+    # Một mùa giải đầy đủ (380 trận) cho mỗi giải đã cấu hình, kèm squad của các đội
+    seasons = []
+    for index, comp_id in enumerate(COMPETITIONS.values()):
+        data = sample_matches(380)
+        for match in data["matches"]:
+            match["id"] += index * 1000
+            match["competition"] = dict(match["competition"], id=int(comp_id))
+        seasons.append(data)
+    team = sample_team()
+
+    tracemalloc.start()
+    store = FootballStore()
+    started = time.perf_counter()
+    for data in seasons:
+        store.ingest("matches", data)
+    for i in range(40):
+        store.ingest("team", dict(team, id=57 + i))
+    ingest_ms = (time.perf_counter() - started) * 1000
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"store: {store.stats()}  ingest={ingest_ms:.1f} ms  memory={size / 1024 / 1024:.2f} MB")
+
+    comp_ids = list(COMPETITIONS.values())
+    queries = {
+        "page of one competition": lambda: store.query([comp_ids[0]], "2026-10-01", "2026-10-31", limit=50),
+        "live, all competitions": lambda: store.query(comp_ids, "2026-10-01", "2026-10-31",
+                                                     STATUS_GROUPS["LIVE"], limit=50),
+        "team fixtures": lambda: store.query(comp_ids, "2026-10-01", "2026-10-31", team_id=60),
+        "next fixture": lambda: store.next_fixture(store.find_team("Home 3"), "2026-10-15"),
+        "squad": lambda: store.team_players(60),
+    }
+    for name, query in queries.items():
+        samples = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            query()
+            samples.append((time.perf_counter() - started) * 1000)
+        report(name, samples)
+
+
+def bench_history(args):
+    import os
+    import socket
+    import tempfile
+    import tracemalloc
+    import chat_relay
+    from chat_relay import ChatRelay, HISTORY_LAST, HISTORY_REQUEST, HISTORY_SINCE, KIND_HISTORY, KIND_JOIN
+    from database import ChatHistoryStore
+
+    rooms = [chat_relay.match_room(i) for i in range(max(args.rooms, 10))]
+    store = ChatHistoryStore(os.path.join(tempfile.mkdtemp(), "chat_history.db"))
+    relay = ChatRelay("127.0.0.1", args.port, log=lambda message: None, history=store)
+    threading.Thread(target=relay._history_loop, daemon=True).start()
+
+    # Một thành viên cho mỗi phòng; không cần đọc, datagram thừa bị kernel bỏ
+    member = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    member.bind(("127.0.0.1", 0))
+    address = member.getsockname()
+    for room in rooms:
+        relay.handle(chat_relay.encode_datagram(KIND_JOIN, room), address)
+
+    total = args.requests * 100
+    started = time.perf_counter()
+    for n in range(total):
+        relay.publish(rooms[n % len(rooms)], b"x" * (40 + n % 200))
+    print(f"publish (fan-out + history): {(time.perf_counter() - started) * 1e6 / total:.1f} us/message")
+
+    # Lưu lượng liên tục: bộ nhớ phải phẳng vì bộ đệm vòng của các phòng đã đầy
+    tracemalloc.start()
+    for n in range(total):
+        relay.publish(rooms[n % len(rooms)], b"x" * (40 + n % 200))
+        if (n + 1) % (total // 4) == 0:
+            size, _ = tracemalloc.get_traced_memory()
+            print(f"+{n + 1} messages: memory={size / 1024:.0f} KB  history={relay.stats()['history_bytes'] / 1024:.0f} KB")
+    tracemalloc.stop()
+    while not relay.history_queue.empty():
+        time.sleep(0.1)
+
+    # Catch-up: một yêu cầu, một loạt DELIVER trả về
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(("127.0.0.1", 0))
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, chat_relay.RECEIVE_BUFFER)
+    client.settimeout(2)
+    channel = relay.channels[rooms[0]]
+    requests = {
+        "last 50 (memory)": HISTORY_REQUEST.pack(HISTORY_LAST, 0, 50),
+        "last 256 (memory)": HISTORY_REQUEST.pack(HISTORY_LAST, 0, 256),
+        "since seq (SQLite)": HISTORY_REQUEST.pack(HISTORY_SINCE, channel.epoch, channel.first_seq - 1000),
+    }
+    for name, request in requests.items():
+        samples = []
+        for _ in range(20):
+            started = time.perf_counter()
+            sent = relay.history_sent
+            relay.handle(chat_relay.encode_datagram(KIND_HISTORY, rooms[0], request), client.getsockname())
+            while relay.history_sent == sent:
+                time.sleep(0.0005)
+            expected = relay.history_sent - sent
+            for _ in range(expected):
+                client.recvfrom(65535)
+            samples.append((time.perf_counter() - started) * 1000)
+        report(f"{name}: {expected} messages", samples)
+    print("relay:", relay.stats())
+
+
+BENCHMARKS = {
+    "http": bench_http,
+    "tcp": bench_tcp,
+    "encode": bench_encode,
+    "compress": bench_compress,
+    "serialize": bench_serialize,
+    "store": bench_store,
+    "coalesce": bench_coalesce,
+    "udp": bench_udp,
+    "reliable": bench_reliable,
+    "history": bench_history,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Football Hub benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per run (per client for tcp)")
+    parser.add_argument("--idle", type=int, default=500, help="idle connections held open (tcp)")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent active clients (tcp, coalesce)")
+    parser.add_argument("--latency", type=float, default=20, help="simulated upstream latency in ms (tcp, coalesce)")
+    parser.add_argument("--port", type=int, default=56500, help="first local port to bind (tcp, udp)")
+    parser.add_argument("--peers", default="100,1000,5000", help="comma-separated chat peer counts (udp)")
+    parser.add_argument("--sendto", action="store_true", help="one sendto per recipient instead of sendmmsg (udp)")
+    parser.add_argument("--loss", type=float, default=0.2, help="datagram loss rate in both directions (reliable)")
+    parser.add_argument("--rooms", type=int, default=0, help="spread chat peers over this many match rooms (udp, history)")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and single-flight loading"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+
+        # Thống kê
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        """Return a fresh cached value or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_stale(self, key):
+        """Return the cached value for `key` even if it has expired, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def set(self, key, value, ttl):
+        """Store a value for `ttl` seconds, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def expires_in(self, key):
+        """Seconds until `key` expires (negative once expired), or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0] - time.monotonic()
+
+    def get_or_fetch(self, key, ttl, fetch, refresh_within=0):
+        """Return the cached value for `key`, calling `fetch()` at most once per miss.
+
+        Entries expiring within `refresh_within` seconds count as misses, so a
+        background refresh can run ahead of expiry through the same single flight.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic() + refresh_within:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Đã có thread khác đang tải key này, chờ kết quả của nó
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            self.set(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+class RequestCoalescer:
+    """Runs one computation per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+
+        # Thống kê
+        self.executed = 0
+        self.coalesced = 0
+
+    def run(self, key, compute):
+        """Return `compute()`, or the result of an identical call already in progress"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        """Return executed/coalesced counters and the share of requests that were coalesced"""
+        with self._lock:
+            total = self.executed + self.coalesced
+            return {
+                "in_flight": len(self._inflight),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "ratio": round(self.coalesced / total, 3) if total else 0.0,
+            }
+
+
+class EncodedCache:
+    """LRU of ready-to-send response bytes, reused while the source object is unchanged.
+
+    Entries are keyed by command and remember the exact object they were
+    encoded from, so a refreshed cache entry (a new object) is re-encoded once
+    and every other request for it is served without serialization.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (source object, encoded bytes)
+        self._lock = threading.Lock()
+
+        # Thống kê
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, key, data, encoder):
+        """Return encoder(data), reusing the stored bytes if `data` is the same object"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is data:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        body = encoder(data)
+        with self._lock:
+            self._entries[key] = (data, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
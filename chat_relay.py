@@ -0,0 +1,961 @@
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+
+from batch_send import BatchSender, send_many, sendmmsg_available
+
+PEER_TIMEOUT = 10  # Client không gửi gì (kể cả PING) trong 10 giây bị coi là đã rời đi
+SWEEP_INTERVAL = 1
+STATS_INTERVAL = 60  # Giây giữa hai dòng log thống kê
+MAX_DATAGRAM = 65535
+MAX_ROOMS_PER_PEER = 32
+
+# ---------- Datagram Header ----------
+# magic (0xFF, không bao giờ là byte đầu của văn bản UTF-8), kind, độ dài tên phòng; sau đó là tên phòng và nội dung.
+# Datagram không có header ("PING|..." hoặc văn bản thường) là của client cũ và thuộc phòng "global".
+CHAT_MAGIC = 0xFF
+CHAT_HEADER = struct.Struct("!BBB")
+KIND_PING = 1
+KIND_JOIN = 2
+KIND_LEAVE = 3
+KIND_MSG = 4  # Không tin cậy: relay chuyển nguyên datagram
+# Kênh tin cậy: DATA (client -> relay) mang seq của người gửi và được ACK chọn lọc;
+# relay đánh seq theo phòng cho DELIVER, người nhận thấy lỗ hổng thì gửi NACK để relay gửi lại.
+KIND_DATA = 5
+KIND_ACK = 6
+KIND_DELIVER = 7
+KIND_NACK = 8
+KIND_JOINED = 9  # Trả lời JOIN: epoch và seq kế tiếp của phòng, người nhận bắt đầu đếm từ đó
+# Catch-up: "N tin nhắn gần nhất" hoặc "từ seq X"; relay trả một loạt DELIVER (một sendmmsg).
+# JOIN cũng có thể mang yêu cầu này để vào phòng và nhận lịch sử trong cùng một lượt.
+KIND_HISTORY = 10
+
+# seq của người gửi, base (seq nhỏ nhất người gửi còn chờ ACK: mọi seq nhỏ hơn không cần chờ nữa),
+# chỉ số mảnh, số mảnh. Nhờ base, relay biết luồng bắt đầu từ đâu kể cả khi datagram đầu tiên bị mất hay tới muộn.
+DATA_HEADER = struct.Struct("!IIHH")
+ACK_HEADER = struct.Struct("!II")  # mọi seq < ack đã nhận; bit i = đã nhận seq ack + 1 + i
+DELIVER_HEADER = struct.Struct("!HIHH")  # epoch của phòng, seq trong phòng, chỉ số mảnh, số mảnh
+NACK_ENTRY = struct.Struct("!I")
+ROOM_STATE = struct.Struct("!HII")  # epoch, seq kế tiếp của phòng, seq cũ nhất relay còn gửi lại được
+HISTORY_REQUEST = struct.Struct("!BHI")  # chế độ, epoch (chỉ dùng cho SINCE), N hoặc seq
+HISTORY_LAST = 0
+HISTORY_SINCE = 1
+
+FRAGMENT_SIZE = 1200  # Vừa một gói Ethernet 1500 byte kể cả header
+MAX_FRAGMENTS = 64  # Tin nhắn tối đa ~75 KB
+RECEIVE_WINDOW = 1024  # Số seq tối đa relay giữ chờ lấp lỗ hổng cho mỗi người gửi
+MAX_NACK_ENTRIES = 64
+
+# ---------- Chat History ----------
+# Mỗi phòng giữ một bộ đệm vòng các tin nhắn gần nhất (để gửi lại khi bị NACK và cho catch-up),
+# giới hạn cả số tin nhắn lẫn số byte nên bộ nhớ không tăng theo lưu lượng.
+HISTORY_MESSAGES = 256
+HISTORY_BYTES = 128 * 1024
+MAX_HISTORY_REPLY = 256  # Số tin nhắn tối đa trong một lần trả lịch sử (và tối đa HISTORY_BYTES)
+MAX_IDLE_ROOMS = 256  # Phòng đã hết người vẫn giữ lịch sử; vượt quá thì bỏ phòng vắng lâu nhất
+HISTORY_QUEUE = 10000  # Tin nhắn chờ ghi SQLite; đầy thì bỏ bớt chứ không chặn vòng nhận
+HISTORY_FLUSH_BATCH = 500
+HISTORY_RETENTION = 7 * 24 * 3600
+HISTORY_PURGE_INTERVAL = 3600
+
+GLOBAL_ROOM = "global"
+
+
+def competition_room(comp_id):
+    return f"comp:{comp_id}"
+
+
+def match_room(match_id):
+    return f"match:{match_id}"
+
+
+def encode_datagram(kind, room=GLOBAL_ROOM, payload=b""):
+    room = room.encode("utf8")
+    if len(room) > 255:
+        raise ValueError("Room name too long")
+    return CHAT_HEADER.pack(CHAT_MAGIC, kind, len(room)) + room + payload
+
+
+def decode_datagram(data):
+    """Return (kind, room, payload); raises ValueError for a malformed header"""
+    if not data or data[0] != CHAT_MAGIC:
+        if data.startswith(b"PING|"):
+            return KIND_PING, GLOBAL_ROOM, b""
+        return KIND_MSG, GLOBAL_ROOM, data
+    if len(data) < CHAT_HEADER.size:
+        raise ValueError("Truncated chat header")
+    _, kind, room_length = CHAT_HEADER.unpack_from(data)
+    end = CHAT_HEADER.size + room_length
+    if len(data) < end or not room_length:
+        raise ValueError("Truncated room name")
+    return kind, data[CHAT_HEADER.size:end].decode("utf8"), data[end:]
+
+
+def fragment(body, size=FRAGMENT_SIZE):
+    """Split a message body into datagram-sized chunks (at least one)"""
+    return [body[i:i + size] for i in range(0, len(body), size)] or [b""]
+
+
+def encode_ack(room, ack, bitmap):
+    return encode_datagram(KIND_ACK, room, ACK_HEADER.pack(ack, bitmap))
+
+
+def encode_nack(room, seqs):
+    return encode_datagram(KIND_NACK, room, b"".join(NACK_ENTRY.pack(seq) for seq in seqs[:MAX_NACK_ENTRIES]))
+
+
+def encode_deliver(room, epoch, seq, body):
+    chunks = fragment(body)
+    return [encode_datagram(KIND_DELIVER, room, DELIVER_HEADER.pack(epoch, seq, i, len(chunks)) + chunk)
+            for i, chunk in enumerate(chunks)]
+
+
+def decode_nack(payload):
+    count = min(len(payload) // NACK_ENTRY.size, MAX_NACK_ENTRIES)
+    return [NACK_ENTRY.unpack_from(payload, i * NACK_ENTRY.size)[0] for i in range(count)]
+
+
+class SenderState:
+    """Relay-side receive window of one sender: duplicate suppression, reassembly and in-order release"""
+
+    __slots__ = ("ack_seq", "release_seq", "pending")
+
+    def __init__(self, first_seq):
+        self.ack_seq = first_seq  # Mọi seq nhỏ hơn đã nhận
+        self.release_seq = first_seq  # Seq đầu của tin nhắn kế tiếp sẽ chuyển vào phòng
+        self.pending = {}  # seq -> (chỉ số mảnh, số mảnh, phòng, nội dung) đã nhận nhưng chưa chuyển
+
+    def receive(self, seq, base, index, count, room, chunk):
+        """Store one fragment; returns (released [(room, body)], duplicate)"""
+        if base > self.ack_seq:
+            # Người gửi đã bỏ các seq còn thiếu trước base (hết lượt gửi lại): không chờ chúng nữa.
+            # Các seq trước base đã nhận vẫn nằm trong pending và được chuyển bình thường bên dưới
+            self.ack_seq = base
+            while self.ack_seq in self.pending:
+                self.ack_seq += 1
+        if seq < self.ack_seq or seq in self.pending:
+            return [], True
+        if seq >= self.ack_seq + RECEIVE_WINDOW:
+            return [], False  # Ngoài cửa sổ: không ACK, người gửi sẽ gửi lại sau
+        self.pending[seq] = (index, count, room, chunk)
+        while self.ack_seq in self.pending:
+            self.ack_seq += 1
+
+        released = []
+        while self.release_seq < self.ack_seq:
+            head = self.pending.get(self.release_seq)
+            if head is None or head[0] != 0:
+                # Seq bị bỏ, hoặc mảnh giữa của một tin nhắn có phần đầu đã bị bỏ
+                self.pending.pop(self.release_seq, None)
+                self.release_seq += 1
+                continue
+            count, room = head[1], head[2]
+            fragments = range(self.release_seq, self.release_seq + count)
+            if all(frag in self.pending for frag in fragments):
+                parts = [self.pending.pop(frag) for frag in fragments]
+                released.append((room, b"".join(part[3] for part in parts)))
+                self.release_seq += count
+            elif any(frag < self.ack_seq and frag not in self.pending for frag in fragments):
+                # Thiếu mảnh mà người gửi đã bỏ: tin nhắn không thể ghép lại
+                del self.pending[self.release_seq]
+                self.release_seq += 1
+            else:
+                break
+        return released, False
+
+    def bitmap(self):
+        bits = 0
+        for i in range(32):
+            if self.ack_seq + 1 + i in self.pending:
+                bits |= 1 << i
+        return bits
+
+
+class RoomChannel:
+    """Room sequence numbers plus a ring buffer of recent messages, used for retransmission and catch-up.
+
+    Only message bodies are kept (DELIVER datagrams are rebuilt on demand),
+    bounded by HISTORY_MESSAGES and HISTORY_BYTES.
+    """
+
+    def __init__(self, room, epoch=None, next_seq=0, oldest_seq=None):
+        self.room = room
+        # Epoch đổi khi phòng được tạo lại: client biết seq bắt đầu lại từ 0
+        self.epoch = random.getrandbits(16) if epoch is None else epoch
+        self.next_seq = next_seq
+        self.first_seq = next_seq  # Seq của tin nhắn cũ nhất còn trong bộ đệm
+        self.oldest_seq = next_seq if oldest_seq is None else oldest_seq  # Cũ nhất đã ghi SQLite
+        self.bodies = deque()  # Nội dung các seq first_seq .. next_seq - 1
+        self.size = 0
+
+    def publish(self, body):
+        """Assign the next room seq to a message and keep it; returns (seq, DELIVER datagrams)"""
+        seq = self.next_seq
+        self.next_seq += 1
+        self.bodies.append(body)
+        self.size += len(body)
+        self._trim()
+        return seq, encode_deliver(self.room, self.epoch, seq, body)
+
+    def preload(self, messages):
+        """Refill the buffer from persisted (seq, body) pairs that end right before next_seq"""
+        run = []
+        for seq, body in reversed(messages):
+            if seq != self.next_seq - 1 - len(run):
+                break  # Chỉ lấy đoạn liên tục cuối cùng
+            run.append(body)
+        self.bodies.extend(reversed(run))
+        self.size = sum(len(body) for body in self.bodies)
+        self.first_seq = self.next_seq - len(self.bodies)
+        self._trim()
+
+    def _trim(self):
+        while len(self.bodies) > HISTORY_MESSAGES or (self.size > HISTORY_BYTES and len(self.bodies) > 1):
+            self.size -= len(self.bodies.popleft())
+            self.first_seq += 1
+
+    def get(self, seq):
+        """Body of a room seq still in the buffer, or None"""
+        if self.first_seq <= seq < self.next_seq:
+            return self.bodies[seq - self.first_seq]
+        return None
+
+    def since(self, seq, limit=MAX_HISTORY_REPLY):
+        """Up to `limit` buffered (seq, body) pairs from `seq` on (or from the oldest one kept)"""
+        start = max(seq, self.first_seq)
+        offset = start - self.first_seq
+        return list(zip(range(start, self.next_seq), islice(self.bodies, offset, offset + limit)))
+
+
+class TimerWheel:
+    """Liveness tracking with O(1) touch: each key sits in the slot of the tick it was last seen in"""
+
+    def __init__(self, timeout, resolution=1.0):
+        self.timeout = timeout
+        self.resolution = resolution
+        self.slots = {}  # tick -> set(key)
+        self.tick_of = {}  # key -> tick của lần cuối nhìn thấy
+        self.cursor = None  # Tick nhỏ nhất chưa được quét
+
+    def __contains__(self, key):
+        return key in self.tick_of
+
+    def __len__(self):
+        return len(self.tick_of)
+
+    def keys(self):
+        return self.tick_of.keys()
+
+    def touch(self, key, now):
+        """Mark `key` as seen at `now`; returns True if it was not tracked before"""
+        tick = int(now / self.resolution)
+        if self.cursor is None:
+            self.cursor = tick
+        old = self.tick_of.get(key)
+        if old == tick:
+            return False
+        if old is not None:
+            self._discard(old, key)
+        self.slots.setdefault(tick, set()).add(key)
+        self.tick_of[key] = tick
+        return old is None
+
+    def remove(self, key):
+        tick = self.tick_of.pop(key, None)
+        if tick is not None:
+            self._discard(tick, key)
+
+    def _discard(self, tick, key):
+        slot = self.slots.get(tick)
+        if slot is not None:
+            slot.discard(key)
+            if not slot:
+                del self.slots[tick]
+
+    def expire(self, now):
+        """Remove and return every key not touched within `timeout` of `now`"""
+        if self.cursor is None:
+            return []
+        limit = int((now - self.timeout) / self.resolution)
+        expired = []
+        # Chỉ quét các tick đã qua kể từ lần trước: mỗi slot bị bỏ đi đúng một lần
+        while self.cursor < limit:
+            for key in self.slots.pop(self.cursor, ()):
+                del self.tick_of[key]
+                expired.append(key)
+            self.cursor += 1
+        return expired
+
+
+class ChatRelay:
+    """UDP chat relay: one receive/fan-out loop, liveness expiry on its own thread, logging off the hot path.
+
+    Every message belongs to a room (global, per competition, per match) and
+    only goes to that room's members.
+    """
+
+    def __init__(self, host, port, timeout=PEER_TIMEOUT, log=print, batch_sends=True, history=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.peers = TimerWheel(timeout)
+        self.lock = threading.Lock()
+        self.rooms = {}  # room -> set(address)
+        self.peer_rooms = {}  # address -> set(room)
+        self.recipients = {}  # room -> (BatchSender client mới, BatchSender client cũ), dựng lại khi có người vào/ra
+        self.legacy = set()  # Client cũ (PING/tin nhắn không header): chỉ nhận văn bản UTF-8 thuần
+        self.senders = {}  # address -> SenderState của kênh tin cậy
+        self.channels = {}  # room -> RoomChannel
+        self.idle_channels = OrderedDict()  # room đã hết người -> RoomChannel, cũ nhất trước
+        self.batch_sends = batch_sends and sendmmsg_available()
+        self.log_queue = queue.Queue()
+        self.log = log
+        # Tùy chọn: ChatHistoryStore để ghi lịch sử xuống SQLite (ghi sau, trên thread riêng)
+        self.history = history
+        self.history_queue = queue.Queue(HISTORY_QUEUE)
+        if history is not None:
+            self._restore_history()
+
+        # Thống kê
+        self.received = 0
+        self.relayed = 0
+        self.send_errors = 0
+        self.malformed = 0
+        self.fanouts = 0  # Tin nhắn đã phát tới phòng (mỗi tin một lần, dù gồm nhiều nhóm hay nhiều mảnh)
+        self.send_calls = 0
+        self.delivered = 0
+        self.duplicates = 0
+        self.retransmitted = 0
+        self.history_requests = 0
+        self.history_sent = 0
+        self.history_dropped = 0
+
+    def serve_forever(self):
+        threading.Thread(target=self._log_loop, name="chat-log", daemon=True).start()
+        threading.Thread(target=self._sweep_loop, name="chat-sweep", daemon=True).start()
+        if self.history is not None:
+            threading.Thread(target=self._history_loop, name="chat-history", daemon=True).start()
+        while True:
+            try:
+                data, address = self.sock.recvfrom(MAX_DATAGRAM)
+            except OSError as e:
+                self._log(f"Lỗi UDP server: {e}")
+                continue
+            self.handle(data, address)
+
+    def handle(self, data, address):
+        self.received += 1
+        try:
+            kind, room, payload = decode_datagram(data)
+        except ValueError:
+            self.malformed += 1
+            return
+
+        recipients = None
+        joined = None
+        with self.lock:
+            connected = self.peers.touch(address, time.monotonic())
+            legacy = not data or data[0] != CHAT_MAGIC
+            if legacy != (address in self.legacy):
+                self._set_legacy(address, legacy)
+            if connected and legacy:
+                # Client cũ không biết phòng: mọi tin của nó thuộc "global". Client mới tự JOIN phòng cần
+                self._join(address, GLOBAL_ROOM)
+            if kind == KIND_JOIN or kind == KIND_MSG or kind == KIND_DATA:
+                # Gửi vào một phòng cũng là tham gia phòng đó
+                self._join(address, room)
+            elif kind == KIND_LEAVE:
+                self._leave(address, room)
+            if kind == KIND_JOIN and room in self.channels:
+                channel = self.channels[room]
+                joined = encode_datagram(KIND_JOINED, room, self._room_state(channel))
+            if kind == KIND_MSG and room in self.rooms:
+                recipients = self._recipients(room)
+        if connected:
+            self._log(f"New chat client connected: {address}")
+        if recipients is not None:
+            current, legacy = recipients
+            self.fanouts += 1
+            self.fanout(data, address, current)
+            if legacy:
+                # Client cũ không hiểu header: chỉ gửi nội dung tin nhắn
+                self.fanout(payload, address, legacy)
+        elif joined is not None:
+            self.sock.sendto(joined, address)
+            if payload:
+                self.send_history(address, room, payload)
+        elif kind == KIND_DATA:
+            self.receive_data(address, room, payload)
+        elif kind == KIND_NACK:
+            self.retransmit(address, room, payload)
+        elif kind == KIND_HISTORY:
+            self.send_history(address, room, payload)
+
+    def receive_data(self, address, room, payload):
+        """Acknowledge a reliable fragment and publish every message it completes"""
+        if len(payload) < DATA_HEADER.size:
+            self.malformed += 1
+            return
+        seq, base, index, count = DATA_HEADER.unpack_from(payload)
+        if not 0 < count <= MAX_FRAGMENTS or index >= count or base > seq:
+            self.malformed += 1
+            return
+        state = self.senders.get(address)
+        if state is None:
+            # Luồng bắt đầu từ base chứ không phải từ datagram tới trước: seq đầu mất hay tới muộn vẫn được chờ
+            state = self.senders[address] = SenderState(base)
+        released, duplicate = state.receive(seq, base, index, count, room, payload[DATA_HEADER.size:])
+        if duplicate:
+            self.duplicates += 1
+        # ACK cả khi trùng: ACK trước đó có thể đã mất
+        self.sock.sendto(encode_ack(room, state.ack_seq, state.bitmap()), address)
+        for target, body in released:
+            self.publish(target, body)
+
+    def publish(self, room, body):
+        """Give a message the next seq of its room and send it to every member, sender included"""
+        with self.lock:
+            if room not in self.rooms:
+                return
+            channel = self.channels[room]
+            recipients = self._recipients(room)[0]  # Client cũ không nhận kênh tin cậy
+        self.delivered += 1
+        self.fanouts += 1
+        seq, datagrams = channel.publish(body)
+        for datagram in datagrams:
+            self.fanout(datagram, None, recipients)
+        if self.history is not None:
+            try:
+                self.history_queue.put_nowait(("save", (room, channel.epoch, seq, body, time.time())))
+            except queue.Full:
+                self.history_dropped += 1
+
+    def retransmit(self, address, room, payload):
+        """Resend the room seqs a member reported missing, if still in the buffer"""
+        channel = self.channels.get(room)
+        if channel is None:
+            return
+        datagrams = []
+        for seq in decode_nack(payload):
+            body = channel.get(seq)
+            if body is not None:
+                datagrams.extend(encode_deliver(room, channel.epoch, seq, body))
+        sent, _ = send_many(self.sock, datagrams, address, self.batch_sends)
+        self.retransmitted += sent
+
+    def send_history(self, address, room, payload):
+        """Answer a catch-up request ("last N" or "since seq X") with one batch of DELIVER datagrams"""
+        if len(payload) < HISTORY_REQUEST.size:
+            self.malformed += 1
+            return
+        mode, epoch, value = HISTORY_REQUEST.unpack_from(payload)
+        with self.lock:
+            channel = self.channels.get(room) or self.idle_channels.get(room)
+        if channel is None:
+            return
+        if mode == HISTORY_LAST:
+            start = channel.next_seq - min(value, MAX_HISTORY_REPLY)
+        elif mode == HISTORY_SINCE and epoch == channel.epoch:
+            start = value
+        else:
+            return  # Epoch cũ: seq không còn ý nghĩa, client bắt đầu lại từ JOINED
+        start = max(start, channel.oldest_seq)
+        self.history_requests += 1
+        if start < channel.first_seq and self.history is not None and start >= channel.oldest_seq:
+            # Cũ hơn bộ đệm RAM: đọc SQLite trên thread lịch sử, không chặn vòng nhận
+            try:
+                self.history_queue.put_nowait(("load", address, room, channel.epoch, start))
+                return
+            except queue.Full:
+                pass
+        self.send_messages(address, room, channel.epoch, channel.since(start))
+
+    def send_messages(self, address, room, epoch, messages):
+        """Send (seq, body) pairs to one peer as DELIVER datagrams, in as few syscalls as possible"""
+        datagrams = []
+        size = 0
+        for seq, body in messages:
+            if datagrams and size + len(body) > HISTORY_BYTES:
+                break  # Một lần trả không quá HISTORY_BYTES; client xin tiếp phần còn lại
+            datagrams.extend(encode_deliver(room, epoch, seq, body))
+            size += len(body)
+            self.history_sent += 1
+        send_many(self.sock, datagrams, address, self.batch_sends)
+
+    def _room_state(self, channel):
+        oldest = channel.oldest_seq if self.history is not None else channel.first_seq
+        return ROOM_STATE.pack(channel.epoch, channel.next_seq, oldest)
+
+    def _join(self, address, room):
+        rooms = self.peer_rooms.setdefault(address, set())
+        if room in rooms or len(rooms) >= MAX_ROOMS_PER_PEER:
+            return
+        rooms.add(room)
+        if room not in self.rooms:
+            self.rooms[room] = set()
+            self.channels[room] = self.idle_channels.pop(room, None) or RoomChannel(room)
+        self.rooms[room].add(address)
+        self.recipients.pop(room, None)
+
+    def _recipients(self, room):
+        recipients = self.recipients.get(room)
+        if recipients is None:
+            members = self.rooms[room]
+            recipients = self.recipients[room] = (
+                BatchSender([address for address in members if address not in self.legacy], self.batch_sends),
+                BatchSender([address for address in members if address in self.legacy], self.batch_sends),
+            )
+        return recipients
+
+    def _set_legacy(self, address, legacy):
+        if legacy:
+            self.legacy.add(address)
+        else:
+            self.legacy.discard(address)
+        for room in self.peer_rooms.get(address, ()):
+            self.recipients.pop(room, None)
+
+    def _retire(self, room):
+        # Phòng hết người: giữ lịch sử cho người vào sau, trong giới hạn MAX_IDLE_ROOMS
+        del self.rooms[room]
+        self.idle_channels[room] = self.channels.pop(room)
+        while len(self.idle_channels) > MAX_IDLE_ROOMS:
+            self.idle_channels.popitem(last=False)
+
+    def _leave(self, address, room):
+        self.peer_rooms.get(address, set()).discard(room)
+        members = self.rooms.get(room)
+        if members is None or address not in members:
+            return
+        members.discard(address)
+        if not members:
+            self._retire(room)
+        self.recipients.pop(room, None)
+
+    def _forget(self, address):
+        self.peers.remove(address)
+        self.senders.pop(address, None)
+        self.legacy.discard(address)
+        for room in self.peer_rooms.pop(address, ()):
+            members = self.rooms.get(room)
+            if members is not None:
+                members.discard(address)
+                if not members:
+                    self._retire(room)
+            self.recipients.pop(room, None)
+
+    def fanout(self, data, sender, recipients):
+        """Send `data` to every member of a room except the sender"""
+        sent, failed, syscalls = recipients.send(self.sock, data, skip=sender)
+        self.send_calls += syscalls
+        self.relayed += sent
+        if failed:
+            self.send_errors += len(failed)
+            self.drop(failed, "send failed")
+
+    def drop(self, peers, reason):
+        with self.lock:
+            for peer in peers:
+                self._forget(peer)
+        for peer in peers:
+            self._log(f"Removed chat client {peer}: {reason}")
+
+    def _sweep_loop(self):
+        next_stats = time.monotonic() + STATS_INTERVAL
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            now = time.monotonic()
+            with self.lock:
+                expired = self.peers.expire(now)
+                for peer in expired:
+                    self._forget(peer)
+            for peer in expired:
+                self._log(f"Removed inactive client: {peer}")
+            if now >= next_stats:
+                next_stats = now + STATS_INTERVAL
+                self._log(f"Chat relay: {self.stats()}")
+
+    def _restore_history(self):
+        """Recreate recently active rooms from SQLite so epochs, seqs and recent messages survive a restart"""
+        for room, epoch, first_seq, next_seq in reversed(self.history.recent_rooms(MAX_IDLE_ROOMS)):
+            channel = RoomChannel(room, epoch, next_seq, first_seq)
+            channel.preload(self.history.load_last(room, epoch, HISTORY_MESSAGES))
+            self.idle_channels[room] = channel
+
+    def _history_loop(self):
+        """Write published messages to SQLite in batches and serve catch-ups older than the memory buffer"""
+        next_purge = 0.0
+        while True:
+            items = [self.history_queue.get()]
+            while len(items) < HISTORY_FLUSH_BATCH:
+                try:
+                    items.append(self.history_queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = []
+            for item in items:
+                if item[0] == "save":
+                    rows.append(item[1])
+                    continue
+                if rows:
+                    # Ghi trước để lần đọc thấy cả những tin nhắn vừa tới
+                    self.history.save_many(rows)
+                    rows = []
+                _, address, room, epoch, start = item
+                self.send_messages(address, room, epoch, self.history.load(room, epoch, start, MAX_HISTORY_REPLY))
+            if rows:
+                self.history.save_many(rows)
+
+            now = time.time()
+            if now >= next_purge:
+                next_purge = now + HISTORY_PURGE_INTERVAL
+                self.history.purge(now - HISTORY_RETENTION)
+
+    def _log(self, message):
+        # In ra console chậm: đẩy sang thread log để vòng nhận/gửi không bị chặn
+        self.log_queue.put(message)
+
+    def _log_loop(self):
+        while True:
+            self.log(self.log_queue.get())
+
+    def stats(self):
+        with self.lock:
+            history_bytes = sum(channel.size for channel in self.channels.values())
+            history_bytes += sum(channel.size for channel in self.idle_channels.values())
+        return {
+            "peers": len(self.peers),
+            "rooms": len(self.rooms),
+            "received": self.received,
+            "relayed": self.relayed,
+            "send_errors": self.send_errors,
+            "malformed": self.malformed,
+            "delivered": self.delivered,
+            "duplicates": self.duplicates,
+            "retransmitted": self.retransmitted,
+            "history_rooms": len(self.channels) + len(self.idle_channels),
+            "history_requests": self.history_requests,
+            "history_sent": self.history_sent,
+            "history_dropped": self.history_dropped,
+            "history_bytes": history_bytes,
+            "batched": self.batch_sends,
+            "syscalls_per_message": round(self.send_calls / self.fanouts, 2) if self.fanouts else 0.0,
+        }
+
+
+# ---------- Client Side ----------
+PING_INTERVAL = 3  # Nhỏ hơn nhiều so với PEER_TIMEOUT của relay
+TIMER_INTERVAL = 0.05
+RETRANSMIT_TIMEOUT = 0.25  # Gấp đôi sau mỗi lần gửi lại
+MAX_ATTEMPTS = 8
+SEND_WINDOW = 256  # Số mảnh tối đa đang chờ ACK
+NACK_INTERVAL = 0.2
+RECEIVE_BUFFER = 1 << 20  # Đủ cho một lần trả lịch sử (tới MAX_HISTORY_REPLY datagram) mà không bị kernel bỏ
+GAP_TIMEOUT = 3  # Lỗ hổng không tiến triển trong 3 giây thì bỏ qua để không kẹt cả phòng
+
+
+class _RoomInbound:
+    """Receiver-side state of one room: reassembly, duplicate suppression and in-order delivery"""
+
+    __slots__ = ("epoch", "next_seq", "head", "messages", "gap_since", "nacked_at")
+
+    def __init__(self, epoch, first_seq):
+        self.epoch = epoch
+        self.next_seq = first_seq
+        self.head = first_seq  # Seq lớn nhất biết là đã tồn tại + 1 (từ DELIVER hoặc JOINED)
+        self.messages = {}  # room seq -> [số mảnh, {chỉ số mảnh: nội dung}]
+        self.gap_since = None
+        self.nacked_at = 0.0
+
+    def complete(self, seq):
+        entry = self.messages.get(seq)
+        return entry is not None and len(entry[1]) == entry[0]
+
+    def missing(self):
+        return [seq for seq in range(self.next_seq, self.head) if not self.complete(seq)]
+
+    def pop_ready(self):
+        """Remove and return the bodies of complete messages at the front, in order"""
+        bodies = []
+        while self.complete(self.next_seq):
+            count, parts = self.messages.pop(self.next_seq)
+            bodies.append(b"".join(parts[i] for i in range(count)))
+            self.next_seq += 1
+        return bodies
+
+    def update_gap(self, now):
+        if self.head <= self.next_seq:
+            self.gap_since = None
+        elif self.gap_since is None:
+            self.gap_since = now
+            self.nacked_at = 0.0  # Lỗ hổng mới: NACK ngay ở nhịp timer kế tiếp
+
+
+class ChatPeer:
+    """Client end of the relay protocol: PING keep-alive, rooms and reliable, ordered messages.
+
+    `on_message(room, body)` is called on the receive thread, in room order.
+    """
+
+    def __init__(self, server_address, on_message=None):
+        self.server_address = server_address
+        self.on_message = on_message
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        self.sock.bind(("0.0.0.0", 0))
+        self.lock = threading.Lock()
+        self.deliver_lock = threading.Lock()  # Giữ thứ tự gọi on_message giữa thread nhận và thread timer
+        self.rooms = set()
+        self.next_seq = 0
+        self.unacked = OrderedDict()  # seq -> [phòng, chỉ số mảnh, số mảnh, nội dung, lần gửi cuối, số lần đã gửi]
+        self.inbound = {}  # room -> _RoomInbound
+        self.catch_up = {}  # room -> (chế độ, epoch, giá trị) xin kèm JOIN, bỏ đi khi nhận JOINED
+        self.last_ping = 0.0
+        self.last_join = 0.0
+        self.closed = threading.Event()
+
+        # Thống kê
+        self.sent = 0
+        self.retransmitted = 0
+        self.failed = 0
+        self.received = 0
+        self.duplicates = 0
+        self.skipped = 0
+
+    def start(self):
+        self.ping()
+        threading.Thread(target=self._receive_loop, name="chat-receive", daemon=True).start()
+        threading.Thread(target=self._timer_loop, name="chat-timer", daemon=True).start()
+
+    def close(self):
+        self.closed.set()
+        self.sock.close()
+
+    def ping(self):
+        self.last_ping = time.monotonic()
+        self.sock.sendto(encode_datagram(KIND_PING), self.server_address)
+        # JOIN không được ACK: nhắc lại cùng PING phòng trường hợp bị mất
+        for room in list(self.rooms):
+            self.sock.sendto(encode_datagram(KIND_JOIN, room), self.server_address)
+
+    def join(self, room, last=0, since=None):
+        """Join a room, optionally catching up on the `last` N messages or on everything after
+        `since` = (epoch, seq) of the last message seen, e.g. in a previous session"""
+        self.rooms.add(room)
+        if since is not None:
+            self.catch_up[room] = (HISTORY_SINCE, since[0], since[1] + 1)
+        elif last:
+            self.catch_up[room] = (HISTORY_LAST, 0, last)
+        self.last_join = time.monotonic()
+        self.sock.sendto(self._join_datagram(room), self.server_address)
+
+    def _join_datagram(self, room):
+        request = self.catch_up.get(room)
+        return encode_datagram(KIND_JOIN, room, HISTORY_REQUEST.pack(*request) if request else b"")
+
+    def leave(self, room):
+        self.rooms.discard(room)
+        with self.lock:
+            self.inbound.pop(room, None)
+        self.sock.sendto(encode_datagram(KIND_LEAVE, room), self.server_address)
+
+    def send(self, room, body):
+        """Send a message reliably; False if the send window is full (try again later)"""
+        if isinstance(body, str):
+            body = body.encode("utf8")
+        chunks = fragment(body)
+        if len(chunks) > MAX_FRAGMENTS:
+            raise ValueError("Message too large")
+        now = time.monotonic()
+        with self.lock:
+            if len(self.unacked) + len(chunks) > SEND_WINDOW:
+                return False
+            first_seq = self.next_seq
+            for index, chunk in enumerate(chunks):
+                self.unacked[self.next_seq] = [room, index, len(chunks), chunk, now, 1]
+                self.next_seq += 1
+            datagrams = [self._data_datagram(seq) for seq in range(first_seq, self.next_seq)]
+        for datagram in datagrams:
+            self.sock.sendto(datagram, self.server_address)
+        self.sent += 1
+        return True
+
+    def _data_datagram(self, seq):
+        # base tính lúc gửi (kể cả gửi lại) để luôn phản ánh các seq đã ACK hoặc đã bỏ
+        room, index, count, chunk = self.unacked[seq][:4]
+        base = next(iter(self.unacked))
+        return encode_datagram(KIND_DATA, room, DATA_HEADER.pack(seq, base, index, count) + chunk)
+
+    def _receive_loop(self):
+        while not self.closed.is_set():
+            try:
+                data, _ = self.sock.recvfrom(MAX_DATAGRAM)
+                kind, room, payload = decode_datagram(data)
+            except ValueError:
+                continue
+            except OSError:
+                break
+            if kind == KIND_JOINED and len(payload) >= ROOM_STATE.size:
+                epoch, next_seq, oldest_seq = ROOM_STATE.unpack_from(payload)
+                with self.lock:
+                    state = self.inbound.get(room)
+                    if room in self.rooms and (state is None or state.epoch != epoch):
+                        self.inbound[room] = self._start_room(room, epoch, next_seq, oldest_seq)
+                    elif state is not None and next_seq > state.head:
+                        # JOINED nhắc lại cùng PING cho biết seq mới nhất: phát hiện cả tin nhắn cuối bị mất
+                        state.head = next_seq
+                        state.update_gap(time.monotonic())
+            elif kind == KIND_ACK and len(payload) >= ACK_HEADER.size:
+                self._acknowledge(*ACK_HEADER.unpack_from(payload))
+            elif kind == KIND_DELIVER and len(payload) >= DELIVER_HEADER.size:
+                epoch, seq, index, count = DELIVER_HEADER.unpack_from(payload)
+                with self.deliver_lock:
+                    self._dispatch(room, self._deliver(room, epoch, seq, index, count,
+                                                       payload[DELIVER_HEADER.size:]))
+
+    def _start_room(self, room, epoch, next_seq, oldest_seq):
+        """Receiver state for a freshly joined room, starting early enough to cover the requested catch-up"""
+        first_seq = next_seq
+        request = self.catch_up.pop(room, None)
+        if request is not None:
+            mode, since_epoch, value = request
+            if mode == HISTORY_LAST:
+                first_seq = next_seq - min(value, MAX_HISTORY_REPLY, next_seq)
+            elif since_epoch == epoch:
+                first_seq = min(value, next_seq)
+            first_seq = max(first_seq, oldest_seq)
+        state = _RoomInbound(epoch, first_seq)
+        # Tin nhắn cũ chưa tới được coi như lỗ hổng: lấp bằng lịch sử relay gửi kèm JOINED
+        state.head = next_seq
+        state.update_gap(time.monotonic())
+        return state
+
+    def _dispatch(self, room, bodies):
+        for body in bodies:
+            self.received += 1
+            if self.on_message is not None:
+                self.on_message(room, body)
+
+    def _acknowledge(self, ack, bitmap):
+        with self.lock:
+            while self.unacked:
+                seq = next(iter(self.unacked))
+                if seq >= ack:
+                    break
+                del self.unacked[seq]
+            for i in range(32):
+                if bitmap >> i & 1:
+                    self.unacked.pop(ack + 1 + i, None)
+
+    def _deliver(self, room, epoch, seq, index, count, chunk):
+        """Store one DELIVER fragment; returns the message bodies now deliverable in order"""
+        if not 0 < count <= MAX_FRAGMENTS or index >= count:
+            return []
+        with self.lock:
+            state = self.inbound.get(room)
+            if state is None and room in self.catch_up:
+                # JOIN kèm yêu cầu lịch sử chưa có JOINED: chưa biết cửa sổ nhận bắt đầu từ đâu.
+                # Bỏ qua; JOIN vẫn được gửi lại kèm yêu cầu và tin nhắn này sẽ được lấy lại như một lỗ hổng
+                return []
+            if state is None or state.epoch != epoch:
+                # Lần đầu nghe phòng này (hoặc phòng được tạo lại): bắt đầu từ tin nhắn hiện tại
+                state = self.inbound[room] = _RoomInbound(epoch, seq)
+            if seq < state.next_seq or index in state.messages.get(seq, (0, {}))[1]:
+                self.duplicates += 1
+                return []
+            state.messages.setdefault(seq, [count, {}])[1][index] = chunk
+            state.head = max(state.head, seq + 1)
+            bodies = state.pop_ready()
+            if bodies:
+                state.gap_since = None  # Có tiến triển: GAP_TIMEOUT tính lại từ đầu
+            state.update_gap(time.monotonic())
+            return bodies
+
+    def _timer_loop(self):
+        while not self.closed.wait(TIMER_INTERVAL):
+            now = time.monotonic()
+            resend = []
+            nacks = []
+            late = []
+            with self.lock:
+                # Chưa nhận JOINED: JOIN hoặc câu trả lời đã mất, gửi lại
+                if now - self.last_join >= RETRANSMIT_TIMEOUT:
+                    self.last_join = now
+                    resend.extend(self._join_datagram(room) for room in self.rooms if room not in self.inbound)
+
+                due = []
+                for seq, entry in list(self.unacked.items()):
+                    sent_at, attempts = entry[4:]
+                    if now - sent_at < RETRANSMIT_TIMEOUT * 2 ** (attempts - 1):
+                        continue
+                    if attempts >= MAX_ATTEMPTS:
+                        del self.unacked[seq]
+                        self.failed += 1
+                        continue
+                    entry[4] = now
+                    entry[5] += 1
+                    due.append(seq)
+                resend.extend(self._data_datagram(seq) for seq in due if seq in self.unacked)
+
+                for room, state in self.inbound.items():
+                    if state.gap_since is None:
+                        continue
+                    if now - state.gap_since > GAP_TIMEOUT:
+                        late.append(room)
+                    elif now - state.nacked_at >= NACK_INTERVAL:
+                        state.nacked_at = now
+                        missing = state.missing()
+                        if len(missing) > MAX_NACK_ENTRIES:
+                            # Hụt cả đoạn dài (vừa vào phòng, mất mạng một lúc): xin lịch sử từ seq còn thiếu
+                            request = HISTORY_REQUEST.pack(HISTORY_SINCE, state.epoch, state.next_seq)
+                            nacks.append(encode_datagram(KIND_HISTORY, room, request))
+                        else:
+                            nacks.append(encode_nack(room, missing))
+
+            try:
+                for datagram in resend:
+                    self.sock.sendto(datagram, self.server_address)
+                    self.retransmitted += 1
+                for datagram in nacks:
+                    self.sock.sendto(datagram, self.server_address)
+                if now - self.last_ping >= PING_INTERVAL:
+                    self.ping()
+            except OSError:
+                break
+            for room in late:
+                with self.deliver_lock:
+                    with self.lock:
+                        state = self.inbound.get(room)
+                        bodies = self._skip_gap(state) if state is not None and state.gap_since is not None else []
+                    self._dispatch(room, bodies)
+
+    def _skip_gap(self, state):
+        """Give up on missing messages: jump to the next complete one and deliver from there"""
+        complete = [seq for seq in state.messages if state.complete(seq)]
+        target = min(complete) if complete else state.head
+        self.skipped += target - state.next_seq
+        for seq in [seq for seq in state.messages if seq < target]:
+            del state.messages[seq]
+        state.next_seq = target
+        bodies = state.pop_ready()
+        state.gap_since = None
+        state.update_gap(time.monotonic())
+        return bodies
+
+    def stats(self):
+        with self.lock:
+            unacked = len(self.unacked)
+        return {
+            "sent": self.sent,
+            "unacked": unacked,
+            "retransmitted": self.retransmitted,
+            "failed": self.failed,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+        }
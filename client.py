@@ -1,8 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import socket
-import json
+import queue
 from datetime import datetime
+from connection import ServerConnection
 
 
 # Theme colors
@@ -23,6 +23,11 @@ HOST = "127.0.0.1"
 PORT = 65432
 FORMAT = "utf8"
 
+UI_POLL_MS = 16  # Chu kỳ lấy kết quả mạng về Tk thread (~60fps)
+TREE_SYNC_CHUNK = 100  # Số dòng Treeview cập nhật mỗi lần idle
+MATCH_PAGE_SIZE = 100  # Số trận mỗi trang, trang tiếp theo tải khi cuộn gần cuối bảng
+STATUS_FILTERS = {"All": "ALL", "Live": "LIVE", "Finished": "FINISHED", "Scheduled": "SCHEDULED"}
+
 COMPETITIONS = {
     "All Competitions": "all",
     "Premier League": "2021",
@@ -49,6 +54,15 @@ class ModernFootballApp(tk.Tk):
         # Initialize variables
         self.teams = {}
         self.players = {}
+        self.connection = None
+        self.active_requests = {}  # group -> Future của request mới nhất
+        self.ui_queue = queue.Queue()  # Kết quả từ thread mạng chờ Tk thread xử lý
+        self.loading_count = 0
+        self.tree_state = {}  # Trạng thái đồng bộ của từng Treeview (xem sync_tree)
+        self.current_matches = {}  # match id -> match đang hiển thị, dùng để áp dụng live update
+        self.live_topic = None
+        self.matches_query = None  # Lệnh matches (đã có bộ lọc) của trang đang hiển thị
+        self.matches_cursor = None  # Cursor của trang kế tiếp, None nếu đã hết
 
         # Create UI
         self.create_header()
@@ -58,6 +72,7 @@ class ModernFootballApp(tk.Tk):
 
         # Connect to server
         self.connect_to_server()
+        self.after(UI_POLL_MS, self.process_network_queue)
 
         # Tự động gửi UDP message sau 2 giây
         self.after(2000, self.send_udp_message)
@@ -208,9 +223,17 @@ class ModernFootballApp(tk.Tk):
         tk.Label(controls, text="Status:", background=Colors.CARD_BG).pack(side="left", padx=(0, 10))
 
         self.status_var = tk.StringVar(value="All")
-        ttk.Combobox(controls, textvariable=self.status_var,
-                     values=["All", "Live", "Finished", "Scheduled"],
-                     width=12, state="readonly").pack(side="left", padx=(0, 20))
+        status_combo = ttk.Combobox(controls, textvariable=self.status_var,
+                                    values=list(STATUS_FILTERS.keys()),
+                                    width=12, state="readonly")
+        status_combo.pack(side="left", padx=(0, 20))
+        status_combo.bind("<<ComboboxSelected>>", lambda e: self.load_matches())
+
+        # Nhận cập nhật tỉ số trực tiếp từ server thay vì bấm Load lại
+        self.live_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(controls, text="🔴 Live updates", variable=self.live_var,
+                       command=self.update_live_subscription,
+                       background=Colors.CARD_BG).pack(side="left", padx=(0, 20))
 
         load_btn = tk.Button(controls, text="📥 Load Matches",
                              command=self.load_matches,
@@ -247,7 +270,8 @@ class ModernFootballApp(tk.Tk):
         # Thêm cột "league" vào danh sách columns
         columns = ("date", "time", "home", "score", "away", "status", "league")
         self.matches_tree = ttk.Treeview(tree_frame, columns=columns, show="headings",
-                                         yscrollcommand=v_scroll.set,
+                                         yscrollcommand=lambda first, last: self.on_matches_scroll(
+                                             v_scroll, first, last),
                                          xscrollcommand=h_scroll.set)
 
         # Configure columns - Thêm cột "league" vào headers
@@ -471,6 +495,9 @@ class ModernFootballApp(tk.Tk):
                                          anchor="e")
         self.connection_label.pack(side="right", padx=10, pady=5)
 
+        # Thanh tiến trình, chỉ hiện khi có request đang chờ
+        self.progress = ttk.Progressbar(self.status_bar, mode="indeterminate", length=120)
+
     # Navigation methods
     def show_matches(self):
         self.notebook.select(0)
@@ -491,26 +518,152 @@ class ModernFootballApp(tk.Tk):
     def connect_to_server(self):
         """Connect to server"""
         try:
-            self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client.connect((HOST, PORT))
+            self.connection = ServerConnection(HOST, PORT, on_push=self.on_server_push)
+            self.connection.connect()
             self.update_status("Connected to server")
             self.connection_label.configure(text="🟢 Connected", foreground=Colors.SUCCESS)
         except Exception as e:
+            self.connection = None
             self.update_status(f"Connection failed: {str(e)}")
             self.connection_label.configure(text="🔴 Disconnected", foreground=Colors.DANGER)
             messagebox.showerror("Connection Error", f"Could not connect to server:\n{str(e)}")
 
-    def safe_recv(self):
-        """Safely receive data"""
+    def request_async(self, command, on_result, group=None, on_error=None):
+        """Send a command in the background and call `on_result(data)` on the Tk thread.
+
+        A newer request in the same `group` cancels the older one, so a slow
+        response for a competition the user already switched away from is dropped.
+        """
+        if self.connection is None:
+            messagebox.showerror("Connection Error", "Not connected to server")
+            return None
+
+        if group is not None:
+            previous = self.active_requests.pop(group, None)
+            if previous is not None:
+                previous.cancel()
+
         try:
-            data = self.client.recv(65535).decode(FORMAT)
-            return json.loads(data)
-        except json.JSONDecodeError:
-            messagebox.showerror("Error", "Invalid data received from server")
-            return {}
-        except Exception as e:
-            messagebox.showerror("Error", f"Communication error: {str(e)}")
-            return {}
+            future = self.connection.request(command)
+        except OSError as e:
+            self.show_request_error(ConnectionError(str(e)))
+            return None
+        if group is not None:
+            self.active_requests[group] = future
+        self.set_loading(+1)
+        # Callback chạy trên thread đọc socket: chỉ đẩy vào hàng đợi, Tk thread sẽ xử lý
+        future.add_done_callback(
+            lambda f: self.ui_queue.put(lambda: self.finish_request(f, on_result, on_error, group)))
+        return future
+
+    def request_batch_async(self, commands, on_result, group=None):
+        """Pipeline several commands; `on_result(command, data)` runs as each one completes"""
+        for command in commands:
+            self.request_async(command, lambda data, c=command: on_result(c, data),
+                               group=f"{group}:{command}" if group else None)
+
+    def process_network_queue(self):
+        """Run callbacks queued by the network thread on the Tk thread"""
+        try:
+            while True:
+                self.ui_queue.get_nowait()()
+        except queue.Empty:
+            pass
+        finally:
+            self.after(UI_POLL_MS, self.process_network_queue)
+
+    def finish_request(self, future, on_result, on_error, group):
+        """Deliver a finished request to its callback"""
+        self.set_loading(-1)
+        if group is not None and self.active_requests.get(group) is future:
+            del self.active_requests[group]
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            on_result(future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            self.show_request_error(error)
+
+    def on_server_push(self, data):
+        """Called on the network thread for every server push"""
+        self.ui_queue.put(lambda: self.apply_live_update(data))
+
+    def show_request_error(self, error):
+        """Report a failed request"""
+        if isinstance(error, ConnectionError):
+            self.connection_label.configure(text="🔴 Disconnected", foreground=Colors.DANGER)
+        self.update_status(f"Error: {str(error)}")
+        messagebox.showerror("Error", f"Communication error: {str(error)}")
+
+    def set_loading(self, delta):
+        """Track in-flight requests and show the progress bar while any are pending"""
+        self.loading_count = max(0, self.loading_count + delta)
+        if self.loading_count:
+            if not self.progress.winfo_ismapped():
+                self.progress.pack(side="right", padx=10, pady=5)
+                self.progress.start(15)
+        elif self.progress.winfo_ismapped():
+            self.progress.stop()
+            self.progress.pack_forget()
+
+    def sync_tree(self, tree, rows):
+        """Make `tree` show `rows` [(iid, values)], touching only rows that changed.
+
+        Rows are applied in chunks of TREE_SYNC_CHUNK per idle tick so large
+        result sets never block rendering; a newer sync replaces a pending one.
+        """
+        state = self.tree_state.setdefault(str(tree), {"values": {}, "order": [], "job": None})
+        if state["job"] is not None:
+            self.after_cancel(state["job"])
+            state["job"] = None
+
+        # Chuẩn hóa values thành chuỗi và đảm bảo iid không trùng
+        unique_rows = []
+        seen = set()
+        for iid, values in rows:
+            iid = str(iid)
+            while iid in seen:
+                iid += "+"
+            seen.add(iid)
+            unique_rows.append((iid, tuple(str(value) for value in values)))
+
+        removed = [iid for iid in state["order"] if iid not in seen]
+        if removed:
+            tree.delete(*removed)
+            for iid in removed:
+                state["values"].pop(iid, None)
+            state["order"] = [iid for iid in state["order"] if iid in seen]
+
+        self._sync_tree_chunk(tree, state, unique_rows, 0)
+
+    def _sync_tree_chunk(self, tree, state, rows, start):
+        order = state["order"]
+        known = state["values"]
+        end = min(start + TREE_SYNC_CHUNK, len(rows))
+        for index in range(start, end):
+            iid, values = rows[index]
+            if iid not in known:
+                tree.insert("", index, iid=iid, values=values)
+                known[iid] = values
+                order.insert(index, iid)
+                continue
+
+            if known[iid] != values:
+                tree.item(iid, values=values)
+                known[iid] = values
+            if order[index] != iid:
+                order.remove(iid)
+                order.insert(index, iid)
+                tree.move(iid, "", index)
+
+        if end < len(rows):
+            state["job"] = self.after_idle(self._sync_tree_chunk, tree, state, rows, end)
+        else:
+            state["job"] = None
 
     def update_status(self, message):
         """Update status bar"""
@@ -524,70 +677,104 @@ class ModernFootballApp(tk.Tk):
     # Data loading methods
     def load_matches(self):
         """Load matches"""
-        self.update_status("Loading matches...")
+        comp_id = self.get_competition_id()
+        days = self.days_var.get()
 
-        try:
+        if comp_id == "all":
+            # Nếu chọn "All Competitions", server tải song song và gộp kết quả
+            self.update_status("Loading matches from all competitions...")
+        else:
+            self.update_status("Loading matches...")
+        # Lọc theo trạng thái và phân trang ngay trên server
+        status = STATUS_FILTERS.get(self.status_var.get(), "ALL")
+        self.matches_query = f"matches {comp_id} {days} status={status} view=slim"
+        self.matches_cursor = None
+        self.request_async(f"{self.matches_query} limit={MATCH_PAGE_SIZE}", self.show_loaded_matches,
+                           group="matches")
+        self.update_live_subscription()
+
+    def load_more_matches(self):
+        """Request the next page of the current matches query"""
+        if self.matches_cursor is None or "matches" in self.active_requests:
+            return
+        self.update_status("Loading more matches...")
+        self.request_async(f"{self.matches_query} limit={MATCH_PAGE_SIZE} cursor={self.matches_cursor}",
+                           lambda data: self.show_loaded_matches(data, append=True), group="matches")
+
+    def on_matches_scroll(self, scrollbar, first, last):
+        """Keep the scrollbar in sync and fetch the next page near the bottom of the table"""
+        scrollbar.set(first, last)
+        if float(last) >= 0.9:
+            self.load_more_matches()
+
+    def show_loaded_matches(self, data, append=False):
+        """Render a matches response; `append` adds a further page to the rows already shown"""
+        if not append:
+            self.current_matches = {}
+        self.current_matches.update((match.get("id"), match) for match in data.get("matches", []))
+        self.matches_cursor = data.get("nextCursor")
+        self.display_matches({"matches": list(self.current_matches.values())})
+        competitions = data.get("resultSet", {}).get("competitions")
+        if competitions and self.current_matches:
+            more = " (scroll for more)" if self.matches_cursor else ""
+            self.update_status(f"Loaded {len(self.current_matches)} matches from {competitions} competitions{more}")
+
+    def update_live_subscription(self):
+        """Subscribe to live updates for the selected competition, or unsubscribe"""
+        topic = None
+        if self.live_var.get():
             comp_id = self.get_competition_id()
-            days = self.days_var.get()
-
-            # Clear existing data
-            self.matches_tree.delete(*self.matches_tree.get_children())
-
-            if comp_id == "all":
-                # Nếu chọn "All Competitions", tải trận đấu từ tất cả các giải
-                all_matches = []
-                comp_count = 0
-
-                for comp_name, comp_code in COMPETITIONS.items():
-                    if comp_code == "all":  # Bỏ qua tùy chọn "All Competitions"
-                        continue
-
-                    self.update_status(f"Loading matches from {comp_name}...")
-                    self.client.sendall(f"matches {comp_code} {days}".encode(FORMAT))
-                    data = self.safe_recv()
-
-                    if data and "matches" in data:
-                        all_matches.extend(data["matches"])
-                        comp_count += 1
-
-                # Xử lý và hiển thị dữ liệu trận đấu
-                self.display_matches({"matches": all_matches})
-                self.update_status(f"Loaded matches from {comp_count} competitions")
+            topic = "live" if comp_id == "all" else comp_id
+        if topic == self.live_topic or self.connection is None:
+            return
 
-            else:
-                # Tải trận đấu từ một giải cụ thể
-                self.client.sendall(f"matches {comp_id} {days}".encode(FORMAT))
-                data = self.safe_recv()
-                self.display_matches(data)
+        if self.live_topic is not None:
+            self.request_async(f"unsubscribe {self.live_topic}", lambda data: None)
+        if topic is not None:
+            self.request_async(f"subscribe {topic}", lambda data: None)
+        self.live_topic = topic
 
-        except Exception as e:
-            self.update_status(f"Error loading matches: {str(e)}")
-            messagebox.showerror("Error", f"Failed to load matches:\n{str(e)}")
+    def apply_live_update(self, data):
+        """Apply a pushed score/status delta to the matches table"""
+        if data.get("topic") != self.live_topic:
+            return
+        changed = 0
+        for change in data.get("changes", []):
+            match = self.current_matches.get(change.get("id"))
+            if match is None:
+                continue
+            match["status"] = change.get("status")
+            match.setdefault("score", {})["fullTime"] = change.get("score", {})
+            changed += 1
+        if changed:
+            # sync_tree chỉ cập nhật những dòng thực sự thay đổi
+            self.display_matches({"matches": list(self.current_matches.values())})
+            self.update_status(f"🔴 Live update: {changed} matches changed")
 
     def load_standings(self):
         """Load standings"""
         self.update_status("Loading standings...")
+        comp_id = self.get_competition_id()
+        self.request_async(f"standings {comp_id} view=slim", self.display_standings, group="standings")
 
+    def display_standings(self, data):
+        """Display standings in the treeview"""
         try:
-            comp_id = self.get_competition_id()
-            self.client.sendall(f"standings {comp_id}".encode(FORMAT))
-            data = self.safe_recv()
-
-            self.standings_tree.delete(*self.standings_tree.get_children())
-
             if not data.get("standings"):
-                self.standings_tree.insert("", "end", values=("No standings data", "", "", "", "", "", "", "", "", ""))
+                self.sync_tree(self.standings_tree,
+                               [("empty", ("No standings data", "", "", "", "", "", "", "", "", ""))])
                 return
 
-            for table in data.get("standings", []):
+            rows = []
+            for table_index, table in enumerate(data.get("standings", [])):
                 if "group" in table:
-                    self.standings_tree.insert("", "end", values=(
+                    rows.append((f"g{table_index}", (
                         f"--- GROUP {table['group']} ---", "", "", "", "", "", "", "", "", ""
-                    ))
+                    )))
 
                 for row in table.get("table", []):
                     team_name = row.get("team", {}).get("name", "Unknown")
-                    self.standings_tree.insert("", "end", values=(
+                    rows.append((f"s{table_index}:{row.get('team', {}).get('id')}", (
                         row.get("position", ""),
                         team_name,
                         row.get("playedGames", ""),
@@ -598,9 +785,10 @@ class ModernFootballApp(tk.Tk):
                         row.get("goalsAgainst", ""),
                         row.get("goalDifference", ""),
                         row.get("points", "")
-                    ))
+                    )))
                     self.teams[team_name] = row.get("team", {}).get("id")
 
+            self.sync_tree(self.standings_tree, rows)
             self.team_combo["values"] = list(self.teams.keys())
             self.update_status("Standings loaded successfully")
 
@@ -611,23 +799,22 @@ class ModernFootballApp(tk.Tk):
     def load_scorers(self):
         """Load scorers"""
         self.update_status("Loading scorers...")
+        comp_id = self.get_competition_id()
+        self.request_async(f"scorers {comp_id} view=slim", self.display_scorers, group="scorers")
 
+    def display_scorers(self, data):
+        """Display scorers in the treeview"""
         try:
-            comp_id = self.get_competition_id()
-            self.client.sendall(f"scorers {comp_id}".encode(FORMAT))
-            data = self.safe_recv()
-
-            self.scorers_tree.delete(*self.scorers_tree.get_children())
-
             if not data.get("scorers"):
-                self.scorers_tree.insert("", "end", values=("No scorers data", "", "", "", "", "", ""))
+                self.sync_tree(self.scorers_tree, [("empty", ("No scorers data", "", "", "", "", "", ""))])
                 return
 
+            rows = []
             for i, scorer in enumerate(data.get("scorers", []), 1):
                 player = scorer.get("player", {})
                 team = scorer.get("team", {})
 
-                self.scorers_tree.insert("", "end", values=(
+                rows.append((f"p{player.get('id')}", (
                     i,
                     player.get("name", "Unknown"),
                     team.get("name", "Unknown"),
@@ -635,11 +822,12 @@ class ModernFootballApp(tk.Tk):
                     scorer.get("assists", ""),
                     player.get("position", ""),
                     player.get("nationality", "")
-                ))
+                )))
 
                 self.players[player.get("name", "")] = player.get("id")
                 self.teams[team.get("name", "")] = team.get("id")
 
+            self.sync_tree(self.scorers_tree, rows)
             self.player_combo["values"] = list(self.players.keys())
             self.team_combo["values"] = list(self.teams.keys())
             self.update_status(f"Loaded {len(data.get('scorers', []))} scorers")
@@ -655,17 +843,18 @@ class ModernFootballApp(tk.Tk):
             messagebox.showwarning("Warning", "Please select a team first")
             return
 
+        team_id = self.teams.get(team_name)
+        if not team_id:
+            messagebox.showerror("Error", "Team ID not found")
+            return
+
         self.update_status(f"Loading team info for {team_name}...")
+        self.request_async(f"team {team_id} view=slim", lambda data: self.display_team_info(team_name, data),
+                           group="team")
 
+    def display_team_info(self, team_name, data):
+        """Display team info"""
         try:
-            team_id = self.teams.get(team_name)
-            if not team_id:
-                messagebox.showerror("Error", "Team ID not found")
-                return
-
-            self.client.sendall(f"team {team_id}".encode(FORMAT))
-            data = self.safe_recv()
-
             self.team_info_text.delete("1.0", tk.END)
 
             if not data or "errorCode" in data:
@@ -710,17 +899,18 @@ Website: {data.get('website', 'N/A')}
             messagebox.showwarning("Warning", "Please select a player first")
             return
 
+        player_id = self.players.get(player_name)
+        if not player_id:
+            messagebox.showerror("Error", "Player ID not found")
+            return
+
         self.update_status(f"Loading player info for {player_name}...")
+        self.request_async(f"player {player_id} view=slim", lambda data: self.display_player_info(player_name, data),
+                           group="player")
 
+    def display_player_info(self, player_name, data):
+        """Display player info"""
         try:
-            player_id = self.players.get(player_name)
-            if not player_id:
-                messagebox.showerror("Error", "Player ID not found")
-                return
-
-            self.client.sendall(f"player {player_id}".encode(FORMAT))
-            data = self.safe_recv()
-
             self.player_info_text.delete("1.0", tk.END)
 
             if not data or "errorCode" in data:
@@ -761,12 +951,13 @@ Shirt Number: {data.get('shirtNumber', 'N/A')}
     def display_matches(self, data):
         """Display matches in the treeview"""
         if not data or not data.get("matches"):
-            self.matches_tree.insert("", "end", values=("No matches found", "", "", "", "", "",
-                                                        ""))  # Thêm một giá trị rỗng cho cột league
+            self.sync_tree(self.matches_tree, [("empty", ("No matches found", "", "", "", "", "",
+                                                          ""))])  # Thêm một giá trị rỗng cho cột league
             self.update_status("No matches available for this period")
             return
 
         # Process matches
+        rows = []
         for match in data.get("matches", []):
             try:
                 home_team = match.get("homeTeam", {}).get("name", "Unknown")
@@ -802,9 +993,9 @@ Shirt Number: {data.get('shirtNumber', 'N/A')}
                 league_name = match.get("competition", {}).get("name", "Unknown League")
 
                 # Thêm league_name vào values
-                self.matches_tree.insert("", "end", values=(
+                rows.append((f"m{match.get('id')}", (
                     date_str, time_str, home_team, score, away_team, status_display, league_name
-                ))
+                )))
 
                 # Store team IDs
                 self.teams[home_team] = match.get("homeTeam", {}).get("id")
@@ -814,6 +1005,8 @@ Shirt Number: {data.get('shirtNumber', 'N/A')}
                 print(f"Error processing match: {e}")
                 continue
 
+        self.sync_tree(self.matches_tree, rows)
+
         # Update team combo
         self.team_combo["values"] = list(self.teams.keys())
         self.update_status(f"Loaded {len(data.get('matches', []))} matches")
@@ -863,10 +1056,9 @@ Shirt Number: {data.get('shirtNumber', 'N/A')}
         # Code hiện tại
         try:
             # Đóng kết nối TCP nếu có
-            if hasattr(self, 'client') and self.client:
+            if self.connection is not None:
                 try:
-                    self.client.shutdown(socket.SHUT_RDWR)
-                    self.client.close()
+                    self.connection.close()
                     print("TCP connection closed")
                 except Exception as e:
                     print(f"Error closing TCP connection: {e}")
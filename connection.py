@@ -0,0 +1,111 @@
+import socket
+import threading
+from concurrent.futures import Future
+
+from protocol import (FrameReader, send_frame, decode_payload, available_codecs, available_formats,
+                      MSG_REQUEST, MSG_ERROR, MSG_PUSH)
+
+FORMAT = "utf8"
+
+
+class ServerError(Exception):
+    """Error frame returned by the server"""
+
+
+class ServerConnection:
+    """Framed TCP connection with a background reader and a future-based request API"""
+
+    def __init__(self, host, port, on_push=None, codecs=None, formats=None):
+        self.host = host
+        self.port = port
+        self.codecs = available_codecs() if codecs is None else codecs
+        self.formats = available_formats() if formats is None else formats
+        self.on_push = on_push  # on_push(data): gọi trên thread đọc khi server đẩy MSG_PUSH
+        self.sock = None
+        self.next_request_id = 0
+        self.pending = {}  # request_id -> Future
+        self.lock = threading.Lock()
+        self.reader_thread = None
+        self.closed_error = None  # Lý do thread đọc dừng, nếu kết nối bị đóng từ phía server
+
+    def connect(self, timeout=5):
+        self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        self.sock.settimeout(None)
+        self.closed_error = None
+        self.reader_thread = threading.Thread(target=self._read_loop, name="server-reader", daemon=True)
+        self.reader_thread.start()
+        # Báo cho server các codec nén và định dạng client giải được; việc giải mã chạy trên thread đọc
+        self.request(f"hello {','.join(self.codecs) or 'none'} {','.join(self.formats) or 'json'}")
+
+    def request(self, command):
+        """Send a command and return a Future resolved with the decoded response"""
+        future = Future()
+        with self.lock:
+            if self.sock is None:
+                raise ConnectionError(str(self.closed_error or "Not connected to server"))
+            self.next_request_id = (self.next_request_id + 1) & 0xFFFFFFFF
+            request_id = self.next_request_id
+            self.pending[request_id] = future
+            try:
+                send_frame(self.sock, command.encode(FORMAT), request_id, MSG_REQUEST)
+            except OSError:
+                self.pending.pop(request_id, None)
+                raise
+        return future
+
+    def _read_loop(self):
+        sock = self.sock
+        reader = FrameReader(sock)
+        error = ConnectionError("Server closed the connection")
+        try:
+            while True:
+                frame = reader.read_frame()
+                if frame is None:
+                    break
+                request_id, msg_type, flags, payload = frame
+                if msg_type == MSG_PUSH:
+                    if self.on_push is not None:
+                        self.on_push(decode_payload(flags, payload))
+                    continue
+
+                with self.lock:
+                    future = self.pending.pop(request_id, None)
+                # Request đã bị hủy hoặc không còn ai chờ: bỏ qua phản hồi, không cần giải mã
+                if future is None or not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    data = decode_payload(flags, payload)
+                except Exception:
+                    future.set_exception(ValueError("Invalid data received from server"))
+                    continue
+                if msg_type == MSG_ERROR:
+                    future.set_exception(ServerError(data.get("error", "unknown")))
+                else:
+                    future.set_result(data)
+        except Exception as e:
+            error = ConnectionError(f"Communication error: {str(e)}")
+        finally:
+            # Kết nối đã hỏng: request() sau này báo lỗi ngay thay vì gửi đi và chờ mãi
+            with self.lock:
+                if self.sock is sock:
+                    self.sock = None
+                    self.closed_error = error
+            sock.close()
+            self._fail_pending(error)
+
+    def _fail_pending(self, error):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def close(self):
+        with self.lock:
+            sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
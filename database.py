@@ -127,4 +127,203 @@ class Database:
             else:
                 return None
         except Exception:
-            return None
\ No newline at end of file
+            return None
+
+class ApiCacheStore:
+    """Lưu các response của football-data.org xuống SQLite để server khởi động lại không bị 'nguội'"""
+
+    def __init__(self, db_file="football_cache.db"):
+        self.db_file = db_file
+        self.create_tables()
+
+    def create_tables(self):
+        """Tạo bảng api_cache nếu chưa tồn tại"""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS api_cache
+                       (
+                           url           TEXT PRIMARY KEY,
+                           resource      TEXT NOT NULL,
+                           body          TEXT NOT NULL,
+                           etag          TEXT,
+                           last_modified TEXT,
+                           fetched_at    REAL NOT NULL
+                       )
+                       ''')
+
+        conn.commit()
+        conn.close()
+
+    def save(self, url, resource, body, fetched_at, etag=None, last_modified=None):
+        """Ghi (hoặc thay thế) một response"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                           INSERT OR REPLACE INTO api_cache (url, resource, body, etag, last_modified, fetched_at)
+                           VALUES (?, ?, ?, ?, ?, ?)
+                           ''', (url, resource, body, etag, last_modified, fetched_at))
+
+            conn.commit()
+            conn.close()
+            return True
+        except Exception:
+            return False
+
+    def load_all(self):
+        """Đọc toàn bộ response đã lưu"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT url, resource, body, etag, last_modified, fetched_at FROM api_cache')
+            rows = cursor.fetchall()
+            conn.close()
+
+            columns = ['url', 'resource', 'body', 'etag', 'last_modified', 'fetched_at']
+            return [{columns[i]: row[i] for i in range(len(columns))} for row in rows]
+        except Exception:
+            return []
+
+    def purge(self, older_than):
+        """Xóa các response lấy trước thời điểm `older_than` (epoch giây)"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM api_cache WHERE fetched_at < ?', (older_than,))
+            deleted = cursor.rowcount
+
+            conn.commit()
+            conn.close()
+            return deleted
+        except Exception:
+            return 0
+
+
+class ChatHistoryStore:
+    """Lưu lịch sử chat của relay UDP xuống SQLite: phục vụ catch-up cũ hơn bộ đệm RAM và giữ lịch sử qua lần khởi động lại"""
+
+    def __init__(self, db_file="chat_history.db"):
+        self.db_file = db_file
+        self.create_tables()
+
+    def create_tables(self):
+        """Tạo bảng chat_history nếu chưa tồn tại"""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS chat_history
+                       (
+                           room    TEXT    NOT NULL,
+                           epoch   INTEGER NOT NULL,
+                           seq     INTEGER NOT NULL,
+                           body    BLOB    NOT NULL,
+                           sent_at REAL    NOT NULL,
+                           PRIMARY KEY (room, epoch, seq)
+                       )
+                       ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS chat_history_sent_at ON chat_history (sent_at)')
+
+        conn.commit()
+        conn.close()
+
+    def save_many(self, rows):
+        """Ghi một loạt tin nhắn (room, epoch, seq, body, sent_at) trong một transaction"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.executemany('''
+                               INSERT OR REPLACE INTO chat_history (room, epoch, seq, body, sent_at)
+                               VALUES (?, ?, ?, ?, ?)
+                               ''', rows)
+
+            conn.commit()
+            conn.close()
+            return True
+        except Exception:
+            return False
+
+    def load(self, room, epoch, since_seq, limit):
+        """Đọc tối đa `limit` tin nhắn từ seq `since_seq` trở đi, theo thứ tự seq: [(seq, body)]"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                           SELECT seq, body
+                           FROM chat_history
+                           WHERE room = ?
+                             AND epoch = ?
+                             AND seq >= ?
+                           ORDER BY seq
+                           LIMIT ?
+                           ''', (room, epoch, since_seq, limit))
+            rows = cursor.fetchall()
+            conn.close()
+            return [(seq, bytes(body)) for seq, body in rows]
+        except Exception:
+            return []
+
+    def load_last(self, room, epoch, count):
+        """Đọc `count` tin nhắn mới nhất của một phòng, theo thứ tự seq: [(seq, body)]"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                           SELECT seq, body
+                           FROM chat_history
+                           WHERE room = ?
+                             AND epoch = ?
+                           ORDER BY seq DESC
+                           LIMIT ?
+                           ''', (room, epoch, count))
+            rows = cursor.fetchall()
+            conn.close()
+            return [(seq, bytes(body)) for seq, body in reversed(rows)]
+        except Exception:
+            return []
+
+    def recent_rooms(self, limit):
+        """Các phòng có tin nhắn gần đây nhất, mỗi phòng lấy epoch mới nhất: [(room, epoch, seq đầu, seq kế tiếp)]"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                           SELECT room, epoch, MIN(seq), MAX(seq) + 1, MAX(sent_at) AS last_sent
+                           FROM chat_history
+                           GROUP BY room, epoch
+                           ORDER BY last_sent DESC
+                           ''')
+            rows = cursor.fetchall()
+            conn.close()
+
+            rooms = {}
+            for room, epoch, first_seq, next_seq, _ in rows:
+                if room not in rooms and len(rooms) < limit:
+                    rooms[room] = (room, epoch, first_seq, next_seq)
+            return list(rooms.values())
+        except Exception:
+            return []
+
+    def purge(self, older_than):
+        """Xóa các tin nhắn gửi trước thời điểm `older_than` (epoch giây)"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM chat_history WHERE sent_at < ?', (older_than,))
+            deleted = cursor.rowcount
+
+            conn.commit()
+            conn.close()
+            return deleted
+        except Exception:
+            return 0
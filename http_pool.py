@@ -0,0 +1,41 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession:
+    """Shared keep-alive HTTP session for upstream API calls"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, headers=None):
+        self.session = requests.Session()
+        # Mỗi host giữ tối đa `pool_size` kết nối keep-alive, dùng chung giữa các thread
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        if headers:
+            self.session.headers.update(headers)
+        self.timeout = (connect_timeout, read_timeout)
+
+    def get(self, url, **kwargs):
+        """GET with the session's default connect/read timeouts"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        """Return per-host request and connection counts"""
+        pools = self.adapter.poolmanager.pools
+        result = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{key.key_host}:{key.key_port}" if key.key_port else key.key_host
+            result[host] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+        return result
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,81 @@
+# ---------- Field Projections ----------
+# Chỉ giữ các trường client thực sự hiển thị ("view=slim").
+# True = giữ nguyên giá trị; dict = chiếu tiếp vào object con (áp dụng cho từng phần tử nếu là list).
+TEAM_REF = {"id": True, "name": True}
+
+SLIM_VIEWS = {
+    "matches": {
+        "resultSet": True,
+        "nextCursor": True,
+        "matches": {
+            "id": True,
+            "utcDate": True,
+            "status": True,
+            "homeTeam": TEAM_REF,
+            "awayTeam": TEAM_REF,
+            "score": {"fullTime": True},
+            "competition": {"id": True, "name": True},
+        },
+    },
+    "standings": {
+        "standings": {
+            "type": True,
+            "group": True,
+            "table": {
+                "position": True,
+                "team": TEAM_REF,
+                "playedGames": True,
+                "won": True,
+                "draw": True,
+                "lost": True,
+                "goalsFor": True,
+                "goalsAgainst": True,
+                "goalDifference": True,
+                "points": True,
+            },
+        },
+    },
+    "scorers": {
+        "scorers": {
+            "player": {"id": True, "name": True, "position": True, "nationality": True},
+            "team": TEAM_REF,
+            "goals": True,
+            "assists": True,
+        },
+    },
+    "team": {
+        "errorCode": True,
+        "message": True,
+        "id": True,
+        "name": True,
+        "tla": True,
+        "area": {"name": True},
+        "founded": True,
+        "venue": True,
+        "clubColors": True,
+        "website": True,
+        "squad": {"id": True, "name": True, "position": True, "nationality": True},
+    },
+    "player": {
+        "errorCode": True,
+        "message": True,
+        "id": True,
+        "name": True,
+        "dateOfBirth": True,
+        "nationality": True,
+        "position": True,
+        "shirtNumber": True,
+        "currentTeam": {"id": True, "name": True, "contract": True},
+    },
+}
+
+
+def project(data, spec):
+    """Return a copy of `data` containing only the fields named in `spec`"""
+    if spec is True:
+        return data
+    if isinstance(data, list):
+        return [project(item, spec) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], sub_spec) for key, sub_spec in spec.items() if key in data}
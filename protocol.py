@@ -0,0 +1,229 @@
+import asyncio
+import json
+import struct
+import zlib
+
+# Codec nén tùy chọn: chỉ dùng khi đã cài thư viện
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Định dạng nhị phân tùy chọn, JSON luôn là mặc định
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# ---------- Frame Format ----------
+# Mỗi frame gồm header cố định 12 byte + payload:
+#   length (4) | request_id (4) | msg_type (1) | flags (1) | reserved (2)
+HEADER = struct.Struct("!IIBBH")
+HEADER_SIZE = HEADER.size
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024  # Giới hạn 64MB để tránh cấp phát vô hạn
+MAX_REQUEST_SIZE = 64 * 1024  # Frame client gửi lên chỉ là lệnh vài byte: server không cấp phát hơn mức này
+
+# Message types
+MSG_REQUEST = 1
+MSG_RESPONSE = 2
+MSG_ERROR = 3
+MSG_PUSH = 4  # Server chủ động gửi (request_id = 0), ví dụ cập nhật tỉ số trực tiếp
+
+
+# Flags: 3 bit thấp là codec nén của payload
+CODEC_MASK = 0x07
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+
+CODEC_IDS = {"zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD, "lz4": CODEC_LZ4}
+CODEC_PREFERENCE = ["zstd", "lz4", "zlib"]  # Codec tốt hơn đứng trước
+
+# Flags: bit 3-4 là định dạng serialize của payload
+WIRE_FORMAT_MASK = 0x18
+WIRE_FORMAT_IDS = {"json": 0x00, "msgpack": 0x08}
+WIRE_FORMAT_PREFERENCE = ["msgpack", "json"]
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def available_codecs():
+    """Codec names usable in this process, best first"""
+    installed = {"zlib": True, "zstd": zstandard is not None, "lz4": lz4_frame is not None}
+    return [name for name in CODEC_PREFERENCE if installed[name]]
+
+
+def negotiate_codec(offered):
+    """Pick the best codec both sides support, or None"""
+    for name in available_codecs():
+        if name in offered:
+            return name
+    return None
+
+
+def available_formats():
+    """Wire format names usable in this process, best first"""
+    installed = {"msgpack": msgpack is not None, "json": True}
+    return [name for name in WIRE_FORMAT_PREFERENCE if installed[name]]
+
+
+def negotiate_format(offered):
+    """Pick the best wire format both sides support (JSON if nothing else matches)"""
+    for name in available_formats():
+        if name in offered:
+            return name
+    return "json"
+
+
+def encode_payload(wire_format, data):
+    """Serialize a response object in a wire format"""
+    if wire_format == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data).encode("utf8")
+
+
+def decode_payload(flags, payload):
+    """Decompress and deserialize a frame payload according to its flags"""
+    payload = decompress(flags, payload)
+    if flags & WIRE_FORMAT_MASK == WIRE_FORMAT_IDS["msgpack"]:
+        if msgpack is None:
+            raise ProtocolError("msgpack payload received but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return json.loads(payload)
+
+
+def compress(codec, data):
+    """Compress `data` with a codec name"""
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "lz4":
+        return lz4_frame.compress(data)
+    raise ProtocolError(f"Unknown codec: {codec}")
+
+
+def decompress(flags, payload):
+    """Undo the compression recorded in a frame's flags"""
+    codec = flags & CODEC_MASK
+    if codec == CODEC_NONE:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(payload, max_output_size=MAX_FRAME_SIZE)
+    if codec == CODEC_LZ4 and lz4_frame is not None:
+        return lz4_frame.decompress(payload)
+    raise ProtocolError(f"Unsupported codec id: {codec}")
+
+
+def pack_header(length, request_id=0, msg_type=MSG_RESPONSE, flags=0):
+    """Build a frame header"""
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame too large: {length} bytes")
+    return HEADER.pack(length, request_id, msg_type, flags, 0)
+
+
+def send_frame(sock, payload, request_id=0, msg_type=MSG_RESPONSE, flags=0):
+    """Send one frame without copying large payloads"""
+    header = pack_header(len(payload), request_id, msg_type, flags)
+    if len(payload) <= 4096 or not hasattr(sock, "sendmsg"):
+        sock.sendall(header + payload)
+        return
+
+    # Gửi header và payload trong cùng một syscall (tránh Nagle/delayed ACK)
+    buffers = [memoryview(header), memoryview(payload)]
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            else:
+                buffers[0] = buffers[0][sent:]
+                sent = 0
+
+
+class FrameReader:
+    """Reassemble frames from a stream socket into a preallocated buffer"""
+
+    def __init__(self, sock, initial_size=64 * 1024, max_frame_size=MAX_FRAME_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(initial_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Vị trí byte chưa xử lý đầu tiên
+        self.end = 0  # Vị trí sau byte cuối cùng đã nhận
+
+    def _ensure_capacity(self, needed):
+        """Make room for `needed` bytes starting at self.start"""
+        if self.start + needed <= len(self.buffer):
+            return
+        pending = self.end - self.start
+        if needed <= len(self.buffer):
+            # Dồn dữ liệu còn lại về đầu buffer
+            self.view[:pending] = self.view[self.start:self.end]
+        else:
+            # Cấp phát buffer mới một lần, đủ cho cả frame
+            new_buffer = bytearray(max(needed, len(self.buffer) * 2))
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = pending
+
+    def _fill(self, needed):
+        """Receive until at least `needed` bytes are buffered; False on EOF"""
+        self._ensure_capacity(needed)
+        while self.end - self.start < needed:
+            received = self.sock.recv_into(self.view[self.end:])
+            if not received:
+                return False
+            self.end += received
+        return True
+
+    def read_frame(self):
+        """Return (request_id, msg_type, flags, payload) or None when the peer closed"""
+        if not self._fill(HEADER_SIZE):
+            return None
+        length, request_id, msg_type, flags, _ = HEADER.unpack_from(self.buffer, self.start)
+        if length > self.max_frame_size:
+            raise ProtocolError(f"Frame too large: {length} bytes")
+
+        if not self._fill(HEADER_SIZE + length):
+            return None
+        body_start = self.start + HEADER_SIZE
+        payload = bytes(self.view[body_start:body_start + length])
+        self.start = body_start + length
+        if self.start == self.end:
+            self.start = self.end = 0
+        return request_id, msg_type, flags, payload
+
+
+# ---------- asyncio Streams ----------
+async def read_frame_async(reader, max_frame_size=MAX_FRAME_SIZE):
+    """asyncio version of FrameReader.read_frame for a StreamReader"""
+    try:
+        header = await reader.readexactly(HEADER_SIZE)
+        length, request_id, msg_type, flags, _ = HEADER.unpack(header)
+        if length > max_frame_size:
+            raise ProtocolError(f"Frame too large: {length} bytes")
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return request_id, msg_type, flags, payload
+
+
+def write_frame(writer, payload, request_id=0, msg_type=MSG_RESPONSE, flags=0):
+    """Queue one frame on an asyncio StreamWriter (caller awaits drain())"""
+    writer.writelines((pack_header(len(payload), request_id, msg_type, flags), payload))
@@ -0,0 +1,129 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Độ ưu tiên: số nhỏ hơn được phục vụ trước
+PRIORITY_LIVE = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+
+
+class RateLimiter:
+    """Process-wide token bucket that hands out tokens in priority order"""
+
+    def __init__(self, rate_per_minute=10, burst=None):
+        self.rate = rate_per_minute / 60.0  # Token mỗi giây
+        self.capacity = burst if burst is not None else rate_per_minute
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0  # Thời điểm server cho phép gọi lại (sau 429)
+        self._waiters = []  # Heap các (priority, seq) đang chờ token
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        # Thống kê
+        self.granted = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _wait_time(self, now):
+        """Seconds until a token may become available"""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        """Take one token; False if none became available within `timeout` seconds"""
+        now = time.monotonic()
+        deadline = None if timeout is None else now + timeout
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(now)
+                    if wait == 0.0 and self._waiters[0] == ticket:
+                        self._tokens -= 1
+                        self.granted += 1
+                        return True
+
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self.rejected += 1
+                            return False
+                        wait = min(wait, remaining) if wait else remaining
+                    self._cond.wait(wait or None)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def has_spare(self, reserve=0):
+        """True if a token is free right now with `reserve` more left over and nobody waiting"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return not self._waiters and self._wait_time(now) == 0.0 and self._tokens >= 1 + reserve
+
+    def is_throttled(self):
+        """True while no token can be handed out immediately"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return self._wait_time(now) > 0
+
+    def block_for(self, seconds):
+        """Hand out no tokens for the next `seconds` (e.g. after HTTP 429)"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers, status_code=200):
+        """Sync the bucket with football-data.org rate headers"""
+        available = _int_header(headers, "X-Requests-Available-Minute")
+        reset = _int_header(headers, "X-RequestCounter-Reset")
+        retry_after = _int_header(headers, "Retry-After")
+
+        if status_code == 429:
+            self.block_for(retry_after or reset or 60)
+            return
+
+        if available is None:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            # Server biết chính xác còn bao nhiêu request, tin theo server
+            self._tokens = min(self._tokens, float(available))
+            if available == 0 and reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return limiter counters"""
+        with self._cond:
+            return {
+                "tokens": round(self._tokens, 2),
+                "waiting": len(self._waiters),
+                "granted": self.granted,
+                "rejected": self.rejected,
+            }
+
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -1,11 +1,28 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import queue
 import socket
+import struct
 import threading
-import requests
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import time
 import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+from cache import TTLCache, EncodedCache, RequestCoalescer
+from chat_relay import ChatRelay
+from database import ApiCacheStore, ChatHistoryStore
+from http_pool import PooledSession
+from modern_theme import COMPETITIONS
+from projection import SLIM_VIEWS, project
+from store import FootballStore, STATUS_GROUPS
+from rate_limit import RateLimiter, PRIORITY_LIVE, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from protocol import (FrameReader, send_frame, read_frame_async, write_frame, ProtocolError, MAX_REQUEST_SIZE,
+                      MSG_REQUEST, MSG_RESPONSE, MSG_ERROR, MSG_PUSH,
+                      CODEC_IDS, WIRE_FORMAT_IDS, negotiate_codec, negotiate_format, compress, encode_payload)
 
 CHAT_CLIENTS = set()  # Lưu danh sách các client đang chat
 
@@ -23,52 +40,237 @@ def log_debug(message):
     print(f"[DEBUG] {message}")
 
 
+# ---------- Upstream Cache ----------
+# TTL (giây) cho từng loại tài nguyên: matches thay đổi liên tục, team/person hầu như không đổi
+CACHE_TTL = {
+    "matches": 30,
+    "standings": 300,
+    "scorers": 600,
+    "team": 24 * 3600,
+    "person": 24 * 3600,
+}
+api_cache = TTLCache(max_entries=1024)
+# Chỉ mục trận/đội/cầu thủ dựng từ mọi response upstream, trả lời truy vấn mà không gọi mạng
+football_store = FootballStore()
+MAX_PAGE_SIZE = 200
+
+# ---------- Upstream Rate Limit ----------
+# Gói free của football-data.org: 10 request/phút cho toàn bộ process
+UPSTREAM_RATE_PER_MINUTE = 10
+RATE_WAIT_TIMEOUT = 3  # Thời gian tối đa (giây) một client chờ token khi không có cache cũ
+PRIORITY = {
+    "matches": PRIORITY_LIVE,
+    "standings": PRIORITY_HIGH,
+    "scorers": PRIORITY_HIGH,
+    "team": PRIORITY_NORMAL,
+    "person": PRIORITY_LOW,
+}
+rate_limiter = RateLimiter(rate_per_minute=UPSTREAM_RATE_PER_MINUTE)
+
+# ---------- Upstream HTTP Session ----------
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10  # Không để upstream treo giữ thread xử lý client mãi mãi
+upstream = PooledSession(pool_size=HTTP_POOL_SIZE,
+                         connect_timeout=HTTP_CONNECT_TIMEOUT,
+                         read_timeout=HTTP_READ_TIMEOUT,
+                         headers=headers)
+
+
+class UpstreamError(Exception):
+    """Non-200 response from football-data.org"""
+
+    def __init__(self, status_code, data):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.data = data
+
+
+class Throttled(UpstreamError):
+    """No upstream request budget is available right now"""
+
+    def __init__(self):
+        super().__init__(429, {"errorCode": 429, "message": "Upstream rate limit reached, try again shortly"})
+
+
+def fetch_json(url, priority=PRIORITY_NORMAL, wait=RATE_WAIT_TIMEOUT):
+    """GET an API url and return the decoded JSON, raising UpstreamError on non-200"""
+    if not rate_limiter.acquire(priority, timeout=wait):
+        log_debug(f"Throttled, skipping upstream call: {url}")
+        raise Throttled()
+
+    # Đã có bản cũ kèm validator: hỏi upstream xem có thay đổi không (304 = dùng lại bản cũ)
+    cached = api_cache.get_stale(url)
+    validator = upstream_validators.get(url) if cached is not None else None
+    request_headers = {}
+    if validator is not None:
+        etag, last_modified = validator[0], validator[1]
+        if etag:
+            request_headers["If-None-Match"] = etag
+        if last_modified:
+            request_headers["If-Modified-Since"] = last_modified
+
+    log_debug(f"Calling API: {url}")
+    resp = upstream.get(url, headers=request_headers)
+    log_debug(f"API Status Code: {resp.status_code}")
+    rate_limiter.update_from_headers(resp.headers, resp.status_code)
+    if request_headers:
+        record_revalidation(resp.status_code == 304, validator)
+
+    if resp.status_code == 304 and validator is not None:
+        return cached
+
+    if resp.status_code == 429:
+        log_debug("Rate limit exceeded, upstream calls paused")
+        raise Throttled()
+
+    if resp.status_code != 200:
+        log_debug(f"API Error: {resp.text}")
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        raise UpstreamError(resp.status_code, data)
+
+    started = time.perf_counter()
+    data = resp.json()
+    parse_ms = (time.perf_counter() - started) * 1000
+    size = int(resp.headers.get("Content-Length") or len(resp.content))
+    upstream_validators[url] = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"), size, parse_ms)
+    return data
+
+
+def record_revalidation(not_modified, validator):
+    """Count a conditional request and what a 304 saved"""
+    with revalidation_lock:
+        revalidation_stats["conditional"] += 1
+        if not_modified:
+            revalidation_stats["not_modified"] += 1
+            revalidation_stats["bytes_saved"] += validator[2]
+            revalidation_stats["parse_ms_saved"] += validator[3]
+
+
+def load_resource(resource, url, priority, wait):
+    """Fetch a url from upstream and persist it for the next warm start"""
+    data = fetch_json(url, priority, wait)
+    football_store.ingest(resource, data)
+    if disk_cache is not None:
+        etag, last_modified = upstream_validators.get(url, (None, None))[:2]
+        disk_cache.save(url, resource, json.dumps(data), time.time(), etag, last_modified)
+    return data
+
+
+def cached_fetch(resource, url):
+    """Fetch an API url through the shared cache (keyed by url)"""
+    stale = api_cache.get_stale(url)
+    # Có dữ liệu cũ thì không bắt client chờ token, trả dữ liệu cũ ngay khi bị throttle
+    wait = 0 if stale is not None else RATE_WAIT_TIMEOUT
+    try:
+        return api_cache.get_or_fetch(url, CACHE_TTL[resource],
+                                      lambda: load_resource(resource, url, PRIORITY[resource], wait))
+    except Throttled:
+        stale = api_cache.get_stale(url)
+        if stale is None:
+            raise
+        log_debug(f"Serving stale {resource} while throttled")
+        return stale
+
+
+# ---------- Persistent Cache ----------
+CACHE_DB = "football_cache.db"
+DISK_CACHE_MAX_AGE = 7 * 24 * 3600  # Bỏ các response cũ hơn 7 ngày khi khởi động
+disk_cache = None  # Mở trong warm_start() khi chạy server
+upstream_validators = {}  # url -> (ETag, Last-Modified, số byte, ms parse) của response gần nhất
+revalidation_stats = {"conditional": 0, "not_modified": 0, "bytes_saved": 0, "parse_ms_saved": 0.0}
+revalidation_lock = threading.Lock()
+
+
+def warm_start():
+    """Load persisted responses into the memory cache, then revalidate stale ones in the background"""
+    global disk_cache
+    disk_cache = ApiCacheStore(CACHE_DB)
+    now = time.time()
+    disk_cache.purge(now - DISK_CACHE_MAX_AGE)
+    today = datetime.today().date().strftime("%Y-%m-%d")
+
+    stale = []
+    loaded = 0
+    for row in disk_cache.load_all():
+        resource = row["resource"]
+        if resource not in CACHE_TTL:
+            continue
+        started = time.perf_counter()
+        try:
+            data = json.loads(row["body"])
+        except ValueError:
+            continue
+        parse_ms = (time.perf_counter() - started) * 1000
+        # TTL còn lại có thể âm: entry hết hạn nhưng vẫn dùng được khi bị throttle
+        remaining = CACHE_TTL[resource] - (now - row["fetched_at"])
+        api_cache.set(row["url"], data, remaining)
+        football_store.ingest(resource, data)
+        loaded += 1
+        upstream_validators[row["url"]] = (row["etag"], row["last_modified"], len(row["body"]), parse_ms)
+
+        # Cửa sổ matches của ngày cũ sẽ không ai hỏi lại, không cần làm mới
+        if remaining <= 0 and (resource != "matches" or f"dateFrom={today}" in row["url"]):
+            stale.append((PRIORITY[resource], row["url"], resource))
+
+    log_debug(f"Warm start: loaded {loaded} cached responses, {len(stale)} to revalidate")
+    if stale:
+        threading.Thread(target=revalidate, args=(sorted(stale),), name="revalidate", daemon=True).start()
+
+
+def revalidate(entries):
+    """Refresh stale (priority, url, resource) entries within the rate budget"""
+    for _, url, resource in entries:
+        try:
+            # get_or_fetch bỏ qua url đã được client làm mới trong lúc chờ
+            api_cache.get_or_fetch(url, CACHE_TTL[resource],
+                                   lambda: load_resource(resource, url, PRIORITY_LOW, None))
+        except Exception as e:
+            log_debug(f"Revalidation failed for {url}: {str(e)}")
+
+
 # ---------- API Wrappers với Debug ----------
-def get_matches_by_comp(comp_id, days=30):  # Tăng lên 30 ngày để đảm bảo có trận đấu
+def matches_url(comp_id, days):
     today = datetime.today().date()
     dateFrom = today.strftime("%Y-%m-%d")
     dateTo = (today + timedelta(days=days)).strftime("%Y-%m-%d")
-    url = f"{API_URL}/competitions/{comp_id}/matches?dateFrom={dateFrom}&dateTo={dateTo}"
+    return f"{API_URL}/competitions/{comp_id}/matches?dateFrom={dateFrom}&dateTo={dateTo}"
+
+
+def get_matches_by_comp(comp_id, days=30):  # Tăng lên 30 ngày để đảm bảo có trận đấu
+    url = matches_url(comp_id, days)
 
-    log_debug(f"Calling API: {url}")
     try:
-        resp = requests.get(url, headers=headers)
-        log_debug(f"API Status Code: {resp.status_code}")
-
-        if resp.status_code == 429:
-            log_debug("Rate limit exceeded. Waiting 10 seconds and trying again...")
-            time.sleep(10)
-            resp = requests.get(url, headers=headers)
-
-        if resp.status_code != 200:
-            log_debug(f"API Error: {resp.text}")
-            # Trả về mock data nếu API thất bại
-            return {
-                "matches": [
-                    {
-                        "id": 1001,
-                        "utcDate": (datetime.now() + timedelta(days=1)).isoformat(),
-                        "status": "SCHEDULED",
-                        "homeTeam": {"id": 101, "name": "Manchester United"},
-                        "awayTeam": {"id": 102, "name": "Liverpool"},
-                        "score": {"fullTime": {"home": None, "away": None}},
-                        "competition": {"id": comp_id, "name": "Premier League"}
-                    },
-                    {
-                        "id": 1002,
-                        "utcDate": (datetime.now() + timedelta(days=2)).isoformat(),
-                        "status": "SCHEDULED",
-                        "homeTeam": {"id": 103, "name": "Arsenal"},
-                        "awayTeam": {"id": 104, "name": "Chelsea"},
-                        "score": {"fullTime": {"home": None, "away": None}},
-                        "competition": {"id": comp_id, "name": "Premier League"}
-                    }
-                ]
-            }
-
-        data = resp.json()
+        data = cached_fetch("matches", url)
         log_debug(f"API returned {len(data.get('matches', []))} matches")
         return data
+    except UpstreamError:
+        # Trả về mock data nếu API thất bại
+        return {
+            "matches": [
+                {
+                    "id": 1001,
+                    "utcDate": (datetime.now() + timedelta(days=1)).isoformat(),
+                    "status": "SCHEDULED",
+                    "homeTeam": {"id": 101, "name": "Manchester United"},
+                    "awayTeam": {"id": 102, "name": "Liverpool"},
+                    "score": {"fullTime": {"home": None, "away": None}},
+                    "competition": {"id": comp_id, "name": "Premier League"}
+                },
+                {
+                    "id": 1002,
+                    "utcDate": (datetime.now() + timedelta(days=2)).isoformat(),
+                    "status": "SCHEDULED",
+                    "homeTeam": {"id": 103, "name": "Arsenal"},
+                    "awayTeam": {"id": 104, "name": "Chelsea"},
+                    "score": {"fullTime": {"home": None, "away": None}},
+                    "competition": {"id": comp_id, "name": "Premier League"}
+                }
+            ]
+        }
     except Exception as e:
         log_debug(f"Exception in get_matches_by_comp: {str(e)}")
         # Trả về mock data nếu lỗi
@@ -87,14 +289,28 @@ def get_matches_by_comp(comp_id, days=30):  # Tăng lên 30 ngày để đảm b
         }
 
 
+# Tải song song nhiều giải; pool riêng để không chiếm worker của request_pool
+FANOUT_WORKERS = 5
+fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def get_matches_multi(comp_ids, days=30):
+    """Fetch several competitions concurrently and merge their matches by utcDate"""
+    matches = []
+    for data in fanout_pool.map(lambda comp_id: get_matches_by_comp(comp_id, days), comp_ids):
+        matches.extend(data.get("matches", []))
+    matches.sort(key=lambda match: match.get("utcDate", ""))
+    log_debug(f"Merged {len(matches)} matches from {len(comp_ids)} competitions")
+    return {"resultSet": {"count": len(matches), "competitions": len(comp_ids)}, "matches": matches}
+
+
 # Giữ nguyên các hàm API khác...
 def get_standings(comp_id):
     url = f"{API_URL}/competitions/{comp_id}/standings"
-    log_debug(f"Calling API: {url}")
     try:
-        resp = requests.get(url, headers=headers)
-        log_debug(f"API Status Code: {resp.status_code}")
-        return resp.json()
+        return cached_fetch("standings", url)
+    except UpstreamError as e:
+        return e.data
     except Exception as e:
         log_debug(f"Exception in get_standings: {str(e)}")
         return {"standings": []}
@@ -102,11 +318,10 @@ def get_standings(comp_id):
 
 def get_scorers(comp_id):
     url = f"{API_URL}/competitions/{comp_id}/scorers"
-    log_debug(f"Calling API: {url}")
     try:
-        resp = requests.get(url, headers=headers)
-        log_debug(f"API Status Code: {resp.status_code}")
-        return resp.json()
+        return cached_fetch("scorers", url)
+    except UpstreamError as e:
+        return e.data
     except Exception as e:
         log_debug(f"Exception in get_scorers: {str(e)}")
         return {"scorers": []}
@@ -114,11 +329,10 @@ def get_scorers(comp_id):
 
 def get_team(team_id):
     url = f"{API_URL}/teams/{team_id}"
-    log_debug(f"Calling API: {url}")
     try:
-        resp = requests.get(url, headers=headers)
-        log_debug(f"API Status Code: {resp.status_code}")
-        return resp.json()
+        return cached_fetch("team", url)
+    except UpstreamError as e:
+        return e.data
     except Exception as e:
         log_debug(f"Exception in get_team: {str(e)}")
         return {}
@@ -126,152 +340,758 @@ def get_team(team_id):
 
 def get_player(player_id):
     url = f"{API_URL}/persons/{player_id}"
-    log_debug(f"Calling API: {url}")
     try:
-        resp = requests.get(url, headers=headers)
-        log_debug(f"API Status Code: {resp.status_code}")
-        return resp.json()
+        return cached_fetch("person", url)
+    except UpstreamError as e:
+        return e.data
     except Exception as e:
         log_debug(f"Exception in get_player: {str(e)}")
         return {}
 
 
+def get_stats():
+    """Server-side counters for the cache, rate limiter and upstream connections"""
+    with revalidation_lock:
+        revalidation = dict(revalidation_stats)
+    revalidation["parse_ms_saved"] = round(revalidation["parse_ms_saved"], 2)
+    return {
+        "cache": api_cache.stats(),
+        "encoded": encoded_responses.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "http": upstream.stats(),
+        "revalidation": revalidation,
+        "store": football_store.stats(),
+        "prefetch": prefetcher.stats(),
+        "coalescing": command_flights.stats(),
+    }
+
+
+# ---------- Live Score Push ----------
+LIVE_STATUSES = {"IN_PLAY", "PAUSED", "LIVE"}
+LIVE_POLL_INTERVAL = 30  # Giây giữa hai lần poll khi có trận đang đá
+IDLE_POLL_INTERVAL = 300  # Khi không có trận nào đang đá
+PUSH_QUEUE_SIZE = 64  # Frame push chờ gửi tối đa mỗi kết nối; đầy nghĩa là client không đọc, hủy đăng ký
+PUSH_BUFFER_LIMIT = 1 << 20  # Giới hạn tương tự cho server asyncio, tính bằng byte trong buffer ghi
+SEND_TIMEOUT = 10  # Client ngừng đọc quá lâu thì send lỗi thay vì treo thread gửi
+MAX_TOPICS_PER_SESSION = 4  # Topic theo dõi tối đa mỗi kết nối
+LIVE_TOPICS = frozenset(COMPETITIONS.values()) | {"live"}
+
+
+class ClientSession:
+    """Per-connection state shared by the threaded and asyncio servers"""
+
+    def __init__(self, addr, push, start_pushes=None):
+        self.addr = addr
+        self.push = push  # push(payload): gửi một frame MSG_PUSH tới client, gọi được từ mọi thread
+        self.start_pushes = start_pushes  # Gọi trước lần subscribe đầu tiên, nếu server cần chuẩn bị đường push
+        self.topics = set()
+        self.codec = None  # Codec nén đã thỏa thuận qua lệnh "hello"
+        self.wire_format = "json"  # Định dạng serialize đã thỏa thuận
+
+
+class LiveHub:
+    """Polls each subscribed topic once and fans score/status deltas out to every subscriber.
+
+    A topic is a competition id or "live" (every match currently in play).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # topic -> set(ClientSession)
+        self.snapshots = {}  # topic -> {match_id: (status, home, away)}
+        self.next_poll = {}  # topic -> time.monotonic() của lần poll tiếp theo
+        self.thread = None
+
+    def subscribe(self, topic, session):
+        with self.lock:
+            if topic not in session.topics and len(session.topics) >= MAX_TOPICS_PER_SESSION:
+                raise ValueError(f"At most {MAX_TOPICS_PER_SESSION} subscriptions per connection")
+            self.subscribers.setdefault(topic, set()).add(session)
+            self.next_poll.setdefault(topic, 0)
+            session.topics.add(topic)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="live-hub", daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self, topic, session):
+        with self.lock:
+            session.topics.discard(topic)
+            members = self.subscribers.get(topic)
+            if members is None:
+                return
+            members.discard(session)
+            if not members:
+                # Không còn ai theo dõi: ngừng poll topic này
+                del self.subscribers[topic]
+                self.snapshots.pop(topic, None)
+                self.next_poll.pop(topic, None)
+
+    def unsubscribe_all(self, session):
+        for topic in list(session.topics):
+            self.unsubscribe(topic, session)
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                due = [topic for topic, at in self.next_poll.items() if at <= now]
+            for topic in due:
+                self.poll(topic)
+            time.sleep(1)
+
+    def fetch_topic(self, topic):
+        if topic == "live":
+            return cached_fetch("matches", f"{API_URL}/matches?status=LIVE")
+        return cached_fetch("matches", matches_url(topic, 1))
+
+    def poll(self, topic):
+        """Fetch one topic, diff it against the last snapshot and push the changes"""
+        try:
+            data = self.fetch_topic(topic)
+        except Exception as e:
+            log_debug(f"Live poll failed for {topic}: {str(e)}")
+            with self.lock:
+                if topic in self.next_poll:
+                    self.next_poll[topic] = time.monotonic() + LIVE_POLL_INTERVAL
+            return
+
+        current = {}
+        for match in data.get("matches", []):
+            full_time = match.get("score", {}).get("fullTime", {})
+            current[match.get("id")] = (match.get("status"), full_time.get("home"), full_time.get("away"))
+        live = any(state[0] in LIVE_STATUSES for state in current.values())
+
+        with self.lock:
+            if topic not in self.subscribers:
+                return
+            previous = self.snapshots.get(topic)
+            self.snapshots[topic] = current
+            self.next_poll[topic] = time.monotonic() + (LIVE_POLL_INTERVAL if live else IDLE_POLL_INTERVAL)
+            sessions = list(self.subscribers[topic])
+
+        if previous is None:
+            return  # Lần poll đầu chỉ lấy mốc so sánh
+        changes = [
+            {"id": match_id, "status": status, "score": {"home": home, "away": away}}
+            for match_id, (status, home, away) in current.items()
+            if previous.get(match_id) != (status, home, away)
+        ]
+        if not changes:
+            return
+
+        # Encode một lần, gửi cùng một buffer cho mọi subscriber
+        body = json.dumps({"topic": topic, "changes": changes}).encode(FORMAT)
+        log_debug(f"Pushing {len(changes)} changes on {topic} to {len(sessions)} clients")
+        for session in sessions:
+            try:
+                session.push(body)
+            except Exception as e:
+                log_debug(f"Push to {session.addr} failed: {str(e)}")
+                self.unsubscribe_all(session)
+
+
+live_hub = LiveHub()
+
+
+# ---------- Background Prefetch ----------
+PREFETCH_DAYS = 7  # Cùng cửa sổ mặc định của client: "matches <id> 7"
+PREFETCH_RESERVE_TOKENS = 3  # Luôn chừa token cho request tương tác, prefetch chỉ dùng phần dư
+# Không có trận đang đá: làm mới thưa, giữa hai lần entry vẫn hết hạn theo CACHE_TTL
+PREFETCH_IDLE_INTERVAL = {"matches": 900, "standings": 6 * 3600, "scorers": 6 * 3600}
+PREFETCH_LEAD = 15  # Làm mới trước khi entry hết hạn vài giây
+PREFETCH_RETRY = 10  # Không có token dư: thử lại sau
+MATCH_DURATION = timedelta(hours=2, minutes=30)
+
+
+class Prefetcher:
+    """Keeps standings, scorers, upcoming fixtures and squads warm in the cache.
+
+    Jobs run only when the rate limiter has tokens to spare. Entries keep their
+    CACHE_TTL; for competitions with a match in play (or about to kick off) they
+    are refreshed just ahead of expiry, otherwise only now and then.
+    """
+
+    def __init__(self, comp_ids, days=PREFETCH_DAYS):
+        self.comp_ids = [str(comp_id) for comp_id in comp_ids]
+        self.days = days
+        self.jobs = []  # Heap (due_at, seq, resource, id)
+        self.scheduled = {}  # (resource, id) -> due_at của job còn hiệu lực trong heap
+        self.live = set()  # Giải đang (hoặc sắp) có trận ở lần làm mới lịch gần nhất
+        self.seq = itertools.count()
+        self.fetched = 0
+        self.skipped = 0
+        self.coalesced = 0  # Lượt làm mới dùng chung kết quả với một request đang tải cùng url
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        now = time.monotonic()
+        for comp_id in self.comp_ids:
+            for resource in ("matches", "standings", "scorers"):
+                self.schedule(resource, comp_id, now)
+        self.thread = threading.Thread(target=self.run, name="prefetch", daemon=True)
+        self.thread.start()
+
+    def schedule(self, resource, item_id, at):
+        """Queue a job at `at`, or move an already queued one earlier"""
+        with self.lock:
+            if self.scheduled.get((resource, item_id), at) < at:
+                return
+            # Entry cũ (nếu có) vẫn nằm trong heap, run() bỏ qua vì due_at không khớp
+            self.scheduled[(resource, item_id)] = at
+            heapq.heappush(self.jobs, (at, next(self.seq), resource, item_id))
+
+    def run(self):
+        while True:
+            with self.lock:
+                due = self.jobs and self.jobs[0][0] <= time.monotonic()
+            if not due or not rate_limiter.has_spare(PREFETCH_RESERVE_TOKENS):
+                time.sleep(1)
+                continue
+            with self.lock:
+                at, _, resource, item_id = heapq.heappop(self.jobs)
+                if self.scheduled.get((resource, item_id)) != at:
+                    continue
+                del self.scheduled[(resource, item_id)]
+            try:
+                delay = self.refresh(resource, item_id)
+            except Throttled:
+                delay = PREFETCH_RETRY
+            except Exception as e:
+                log_debug(f"Prefetch {resource} {item_id} failed: {str(e)}")
+                delay = CACHE_TTL[resource]
+            self.schedule(resource, item_id, time.monotonic() + delay)
+
+    def active(self, comp_id):
+        """True while a match of the competition is (probably) being played or kicks off before the next idle refresh"""
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(seconds=PREFETCH_IDLE_INTERVAL["matches"])
+        return football_store.in_play(comp_id, (now - MATCH_DURATION).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                                      until.strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+    def refresh(self, resource, item_id):
+        """Run one job; returns the delay in seconds until it should run again"""
+        if resource == "team":
+            interval = CACHE_TTL["team"]
+            url = f"{API_URL}/teams/{item_id}"
+        else:
+            # Lịch và bảng xếp hạng chỉ đổi khi có trận: giải không có trận thì làm mới thưa
+            interval = CACHE_TTL[resource] if self.active(item_id) else PREFETCH_IDLE_INTERVAL[resource]
+            if resource == "matches":
+                url = matches_url(item_id, self.days)
+            else:
+                url = f"{API_URL}/competitions/{item_id}/{resource}"
+
+        remaining = api_cache.expires_in(url)
+        if remaining is not None and remaining > PREFETCH_LEAD:
+            # Client vừa làm mới hộ: hẹn lại lúc entry sắp hết hạn
+            self.skipped += 1
+            if resource == "matches" and self.went_live(item_id):
+                interval = CACHE_TTL["matches"]
+            return min(remaining - PREFETCH_LEAD, interval)
+
+        # Đi qua single flight của cache: trùng với một lượt miss của client thì chỉ gọi upstream một lần
+        fetched = []
+
+        def fetch():
+            fetched.append(True)
+            return load_resource(resource, url, PRIORITY_LOW, 0)
+
+        api_cache.get_or_fetch(url, CACHE_TTL[resource], fetch, refresh_within=PREFETCH_LEAD)
+        if fetched:
+            self.fetched += 1
+        else:
+            self.coalesced += 1
+        if resource == "matches":
+            # Lịch vừa tải xong mới biết giải có trận đang (hoặc sắp) đá hay không
+            if self.went_live(item_id):
+                interval = CACHE_TTL["matches"]
+            self.schedule_squads()
+        return max(interval - PREFETCH_LEAD, PREFETCH_RETRY)
+
+    def went_live(self, comp_id):
+        """Track competitions with a match in play; True (and standings/scorers re-queued) when one just became active"""
+        if not self.active(comp_id):
+            self.live.discard(comp_id)
+            return False
+        if comp_id in self.live:
+            return False
+        self.live.add(comp_id)
+        # Bảng xếp hạng/vua phá lưới đang hẹn theo nhịp thưa: làm mới ngay
+        now = time.monotonic()
+        for resource in ("standings", "scorers"):
+            self.schedule(resource, comp_id, now)
+        return True
+
+    def schedule_squads(self):
+        """Queue squads of every team with a fixture in the next `days` days"""
+        today = datetime.today().date()
+        team_ids = football_store.teams_playing_between(today.strftime("%Y-%m-%d"),
+                                                        (today + timedelta(days=self.days)).strftime("%Y-%m-%d"))
+        now = time.monotonic()
+        for team_id in team_ids:
+            self.schedule("team", team_id, now)
+
+    def stats(self):
+        with self.lock:
+            return {"queued": len(self.jobs), "fetched": self.fetched, "skipped": self.skipped,
+                    "coalesced": self.coalesced}
+
+
+prefetcher = Prefetcher(COMPETITIONS.values())
+
+
 # ---------- Socket Handler ----------
+# Các view đã chiếu, dùng lại khi object gốc trong cache chưa đổi
+projected_views = EncodedCache(max_entries=256)
+
+
+def parse_command(option):
+    """Split a command into (cmd, positional args, key=value options)"""
+    parts = option.split()
+    args = [part for part in parts[1:] if "=" not in part]
+    options = dict(part.split("=", 1) for part in parts[1:] if "=" in part)
+    return parts[0], args, options
+
+
+def apply_view(cmd, key, data, options):
+    """Project `data` to the fields the client renders when it asks for view=slim"""
+    if options.get("view") != "slim" or cmd not in SLIM_VIEWS:
+        return data
+    return projected_views.encode(key, data, lambda d: project(d, SLIM_VIEWS[cmd]))
+
+
+MATCH_FILTERS = {"status", "team", "from", "to", "limit", "cursor"}
+
+
+def filter_matches(comp_ids, days, data, options):
+    """Filter and paginate matches server-side (status, team, from/to dates, limit, cursor)"""
+    today = datetime.today().date()
+    date_from = options.get("from", today.strftime("%Y-%m-%d"))
+    date_to = options.get("to", (today + timedelta(days=days)).strftime("%Y-%m-%d"))
+    status = options.get("status", "ALL").upper()
+    if status != "ALL" and status not in STATUS_GROUPS:
+        raise ValueError(f"Unknown status filter: {status}")
+    team_id = None
+    if "team" in options:
+        # team=<id> hoặc tên/TLA (dấu gạch dưới thay cho khoảng trắng: team=Manchester_United)
+        team_id = football_store.find_team(options["team"].replace("_", " "))
+        if team_id is None:
+            team_id = int(options["team"]) if options["team"].isdigit() else -1
+    limit = None
+    if "limit" in options:
+        limit = int(options["limit"])
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}, got {limit}")
+
+    store = football_store
+    if not any(football_store.has_competition(c) for c in comp_ids):
+        # Chưa có dữ liệu thật nào (upstream lỗi, trả mock): lọc trên chính response vừa trả về
+        store = FootballStore()
+        store.ingest("matches", data)
+    page, next_cursor = store.query(comp_ids, date_from, date_to, STATUS_GROUPS.get(status), team_id,
+                                    limit, options.get("cursor"))
+    return {
+        "resultSet": {"count": len(page), "competitions": len(comp_ids)},
+        "matches": page,
+        "nextCursor": next_cursor,
+    }
+
+
+def handle_command(option, session=None):
+    """Run one text command and return the response object"""
+    if not option.split():
+        return {}
+    cmd, args, options = parse_command(option)
+    parts = [cmd] + args
+    key = " ".join(option.split())
+
+    if cmd == "matches":
+        comp_id = parts[1]
+        days = int(parts[2]) if len(parts) > 2 else 30  # Lấy days từ lệnh
+        # "matches all 7" hoặc "matches 2021,2014 7": gộp nhiều giải trong một lần trả lời
+        if comp_id == "all":
+            comp_ids = list(COMPETITIONS.values())
+        else:
+            comp_ids = [c for c in comp_id.split(",") if c]
+        if len(comp_ids) > 1:
+            data = get_matches_multi(comp_ids, days)
+        else:
+            data = get_matches_by_comp(comp_ids[0], days)
+        # "matches 2021 7 status=LIVE team=65 limit=100 cursor=..."
+        if MATCH_FILTERS & options.keys():
+            data = filter_matches(comp_ids, days, data, options)
+        return apply_view(cmd, key, data, options)
+
+    # Giữ nguyên các lệnh khác...
+    elif cmd == "standings":
+        return apply_view(cmd, key, get_standings(parts[1]), options)
+
+    elif cmd == "scorers":
+        return apply_view(cmd, key, get_scorers(parts[1]), options)
+
+    elif cmd == "team":
+        return apply_view(cmd, key, get_team(parts[1]), options)
+
+    elif cmd == "player":
+        return apply_view(cmd, key, get_player(parts[1]), options)
+
+    elif cmd == "next":
+        # "next Liverpool": trận sắp tới (hoặc đang đá) của một đội, trả lời từ bộ nhớ
+        name = " ".join(parts[1:])
+        team_id = football_store.find_team(name)
+        if team_id is None:
+            return {"errorCode": 404, "message": f"Unknown team: {name}"}
+        today = datetime.today().date().strftime("%Y-%m-%d")
+        return {"team": football_store.team_ref(team_id), "match": football_store.next_fixture(team_id, today)}
+
+    elif cmd == "hello":
+        # "hello zstd,zlib msgpack,json": client liệt kê codec và định dạng hỗ trợ, server chọn cái tốt nhất
+        offered = parts[1].split(",") if len(parts) > 1 else []
+        codec = negotiate_codec(offered)
+        wire_format = negotiate_format(parts[2].split(",") if len(parts) > 2 else [])
+        if session is not None:
+            session.codec = codec
+            session.wire_format = wire_format
+        return {"codec": codec or "none", "format": wire_format, "compress_threshold": COMPRESS_THRESHOLD}
+
+    elif cmd == "stats":
+        return get_stats()
+
+    elif cmd in ("subscribe", "unsubscribe"):
+        if session is None:
+            raise ValueError(f"{cmd} needs a persistent connection")
+        topic = parts[1]
+        if cmd == "subscribe":
+            if topic not in LIVE_TOPICS:
+                raise ValueError(f"Unknown topic: {topic}")
+            if session.start_pushes is not None:
+                session.start_pushes()
+            live_hub.subscribe(topic, session)
+        else:
+            live_hub.unsubscribe(topic, session)
+        return {cmd + "d": topic}
+
+    log_debug(f"Unknown command: {cmd}")
+    return {}
+
+
+# Bytes đã encode của các response gần nhất: cùng một object trong cache thì không json.dumps lại
+encoded_responses = EncodedCache(max_entries=256)
+COMPRESS_THRESHOLD = 2048  # Response nhỏ hơn gửi nguyên, nén không đáng
+
+
+def encode_json(data):
+    return json.dumps(data).encode(FORMAT)
+
+
+# Phản hồi lệnh "hello" luôn là JSON vì client chưa biết server chọn định dạng nào
+PLAIN_JSON_COMMANDS = {"hello"}
+# Lệnh thay đổi trạng thái của kết nối: không bao giờ dùng chung kết quả giữa các client
+SESSION_COMMANDS = {"hello", "subscribe", "unsubscribe"}
+# Các client gửi cùng một lệnh cùng lúc (vd. "matches 2021 1" lúc bóng lăn) chờ chung một lần xử lý
+command_flights = RequestCoalescer()
+
+
+def process_request(payload, session=None):
+    """Turn one request payload into (msg_type, response bytes, frame flags)"""
+    option = payload.decode(FORMAT)
+    log_debug(f"Received command: {option}")
+    parts = option.split()
+    codec = session.codec if session is not None else None
+    wire_format = session.wire_format if session is not None else "json"
+    if parts and parts[0] in PLAIN_JSON_COMMANDS:
+        codec, wire_format = None, "json"
+
+    if not parts or parts[0] in SESSION_COMMANDS:
+        return build_response(option, session, wire_format, codec)
+    # Cùng lệnh, cùng định dạng và codec thì bytes trả về giống hệt nhau
+    return command_flights.run((" ".join(parts), wire_format, codec),
+                               lambda: build_response(option, None, wire_format, codec))
+
+
+def build_response(option, session, wire_format, codec):
+    """Run a command and encode its result for the given wire format and codec"""
+    try:
+        data = handle_command(option, session)
+    except (IndexError, ValueError) as e:
+        log_debug(f"Bad command {option!r}: {str(e)}")
+        return MSG_ERROR, encode_json({"error": str(e)}), 0
+
+    key = " ".join(option.split())
+    if wire_format == "json":
+        body = encoded_responses.encode(key, data, encode_json)
+    else:
+        body = encoded_responses.encode((key, wire_format), data,
+                                        lambda d: encode_payload(wire_format, d))
+    flags = WIRE_FORMAT_IDS[wire_format]
+    if codec is None or len(body) < COMPRESS_THRESHOLD:
+        return MSG_RESPONSE, body, flags
+
+    # Bản nén cũng được cache theo (lệnh, định dạng, codec) nên mỗi object chỉ nén một lần
+    compressed = encoded_responses.encode((key, wire_format, codec), data, lambda _: compress(codec, body))
+    return MSG_RESPONSE, compressed, flags | CODEC_IDS[codec]
+
+
+# Các request trên cùng một kết nối được xử lý song song và trả lời theo thứ tự hoàn thành
+MAX_IN_FLIGHT_PER_CONNECTION = 16
+REQUEST_WORKERS = 32
+request_pool = ThreadPoolExecutor(max_workers=REQUEST_WORKERS, thread_name_prefix="request")
+
+
+def set_send_timeout(sock, seconds):
+    """Make blocking sends on `sock` fail after `seconds`; receives keep waiting as before"""
+    if sys.platform == "win32":
+        value = struct.pack("I", int(seconds * 1000))
+    else:
+        value = struct.pack("ll", int(seconds), int(seconds % 1 * 1000000))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, value)
+
+
+def abort(conn):
+    # Frame có thể đã gửi dở: đóng hẳn kết nối, vòng đọc thoát và dọn dẹp như client tự ngắt
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def respond(conn, send_lock, session, request_id, payload):
+    """Process one pipelined request and send its tagged response"""
+    try:
+        msg_type, response, flags = process_request(payload, session)
+    except Exception as e:
+        # Luôn trả lời: client đang chờ đúng request id này
+        log_debug(f"Error processing request {request_id}: {str(e)}")
+        msg_type, response, flags = MSG_ERROR, encode_json({"error": str(e)}), 0
+    log_debug(f"Sending {len(response)} bytes for request {request_id}")
+    with send_lock:
+        try:
+            send_frame(conn, response, request_id, msg_type, flags)
+        except OSError:
+            abort(conn)
+            raise
+
+
 def handle_client(conn, addr):
     print(f"[NEW CONNECTION] {addr}")
+    reader = FrameReader(conn, max_frame_size=MAX_REQUEST_SIZE)
+    send_lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT_PER_CONNECTION)
+    pending = set()
+    outbound = queue.Queue(PUSH_QUEUE_SIZE)
+    set_send_timeout(conn, SEND_TIMEOUT)
+
+    def push(body):
+        # LiveHub gọi từ thread riêng cho mọi subscriber: chỉ xếp hàng, không bao giờ chặn
+        try:
+            outbound.put_nowait(body)
+        except queue.Full:
+            raise ConnectionError("push queue full") from None
+
+    def send_pushes():
+        while True:
+            body = outbound.get()
+            if body is None:
+                return
+            try:
+                with send_lock:
+                    send_frame(conn, body, 0, MSG_PUSH)
+            except OSError as e:
+                log_debug(f"Push to {addr} failed: {str(e)}")
+                abort(conn)
+                return
+
+    pusher = []
+    pusher_lock = threading.Lock()
+
+    def start_pushes():
+        # Chỉ kết nối có subscribe mới cần thread gửi push riêng
+        with pusher_lock:
+            if not pusher:
+                pusher.append(threading.Thread(target=send_pushes, name=f"push-{addr[1]}", daemon=True))
+                pusher[0].start()
+
+    session = ClientSession(addr, push, start_pushes)
+
+    def finished(future):
+        in_flight.release()
+        pending.discard(future)
+        if future.exception() is not None:
+            log_debug(f"Error answering {addr}: {future.exception()}")
+
     try:
         while True:
-            option = conn.recv(1024).decode(FORMAT)
-            if not option:
+            frame = reader.read_frame()
+            if frame is None:
                 break
 
-            log_debug(f"Received command: {option}")
-            parts = option.split()
-            cmd = parts[0]
-
-            if cmd == "matches":
-                comp_id = parts[1]
-                days = int(parts[2]) if len(parts) > 2 else 30  # Lấy days từ lệnh
-                data = get_matches_by_comp(comp_id, days)
-                response = json.dumps(data)
-                log_debug(f"Sending {len(response)} bytes of match data")
-                conn.sendall(response.encode(FORMAT))
-
-            # Giữ nguyên các lệnh khác...
-            elif cmd == "standings":
-                comp_id = parts[1]
-                data = get_standings(comp_id)
-                conn.sendall(json.dumps(data).encode(FORMAT))
-
-            elif cmd == "scorers":
-                comp_id = parts[1]
-                data = get_scorers(comp_id)
-                conn.sendall(json.dumps(data).encode(FORMAT))
-
-            elif cmd == "team":
-                team_id = parts[1]
-                data = get_team(team_id)
-                conn.sendall(json.dumps(data).encode(FORMAT))
-
-            elif cmd == "player":
-                player_id = parts[1]
-                data = get_player(player_id)
-                conn.sendall(json.dumps(data).encode(FORMAT))
+            request_id, msg_type, _, payload = frame
+            if msg_type != MSG_REQUEST:
+                log_debug(f"Unexpected message type {msg_type} from {addr}")
+                continue
 
-            else:
-                log_debug(f"Unknown command: {cmd}")
-                conn.sendall(b"{}")
+            in_flight.acquire()  # Chặn đọc thêm khi client gửi chồng quá nhiều
+            future = request_pool.submit(respond, conn, send_lock, session, request_id, payload)
+            pending.add(future)
+            future.add_done_callback(finished)
+    except ProtocolError as e:
+        log_debug(f"Protocol error from {addr}: {str(e)}")
     except Exception as e:
         log_debug(f"Error handling client {addr}: {str(e)}")
     finally:
+        # Trả lời nốt các request còn đang xử lý trước khi đóng socket
+        wait(list(pending))
+        live_hub.unsubscribe_all(session)
+        with pusher_lock:
+            started = bool(pusher)
+        while started:
+            try:
+                outbound.put_nowait(None)  # Dừng thread gửi push
+                break
+            except queue.Full:
+                outbound.get_nowait()
         conn.close()
         print(f"[DISCONNECTED] {addr}")
 
 
-def run_server():
+def run_server(host=HOST, port=PORT):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.bind((HOST, PORT))
+    s.bind((host, port))
     s.listen()
-    print(f"[LISTENING] Server on {HOST}:{PORT}")
+    print(f"[LISTENING] Server on {host}:{port}")
     while True:
         try:
             conn, addr = s.accept()
-            threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+            threading.Thread(target=handle_client, args=(conn, addr), name=f"client-{addr[1]}", daemon=True).start()
         except Exception as e:
             log_debug(f"Error accepting connection: {str(e)}")
 
 
-# ---------- UDP Server ----------
-def run_udp_server():
-    udp_server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp_server_socket.bind((HOST, 12345))
-    
-    print("UDP Chat Server đang chạy...")
-    
-    # Dictionary lưu trữ danh sách client đang kết nối
-    clients = set()
-    last_ping = {}  # Lưu thời gian ping cuối cùng của mỗi client
+# ---------- Asyncio Server ----------
+# Một event loop giữ toàn bộ kết nối; chỉ các lệnh gọi upstream (blocking) chạy trong thread pool
+MAX_CONCURRENT_REQUESTS = 32
+ASYNC_BACKLOG = 4096
 
-    while True:
+
+async def respond_async(writer, executor, limit, session, request_id, payload):
+    """Process one pipelined request off the event loop and write its tagged response"""
+    loop = asyncio.get_running_loop()
+    async with limit:
         try:
-            data, client_address = udp_server_socket.recvfrom(1024)
-            message = data.decode()
-            
-            # Xử lý tin nhắn PING
-            if message.startswith("PING|"):
-                last_ping[client_address] = time.time()
-                if client_address not in clients:
-                    clients.add(client_address)
-                    print(f"New chat client connected: {client_address}")
-                continue
-            
-            # Thêm client mới vào danh sách
-            if client_address not in clients:
-                clients.add(client_address)
-                last_ping[client_address] = time.time()
-                print(f"New chat client connected: {client_address}")
-            
-            # Log tin nhắn nhận được
-            print(f"Nhận tin nhắn từ {client_address}: {message}")
-            
-            # Xóa clients không hoạt động (không ping trong 10 giây)
-            current_time = time.time()
-            inactive_clients = {
-                client for client in clients 
-                if current_time - last_ping.get(client, 0) > 10
-            }
-            
-            # Xóa các clients không hoạt động
-            for inactive in inactive_clients:
-                clients.discard(inactive)
-                last_ping.pop(inactive, None)
-                print(f"Removed inactive client: {inactive}")
-            
-            # Gửi tin nhắn đến tất cả client còn hoạt động
-            for client in clients:
-                if client != client_address:  # Không gửi lại cho người gửi
-                    try:
-                        udp_server_socket.sendto(data, client)
-                        print(f"Đã gửi tin nhắn đến {client}")
-                    except Exception as e:
-                        print(f"Lỗi gửi tin nhắn đến {client}: {e}")
-                        clients.discard(client)
-                        last_ping.pop(client, None)
-                        
+            msg_type, response, flags = await loop.run_in_executor(executor, process_request, payload, session)
         except Exception as e:
-            print(f"Lỗi UDP server: {e}")
-            if 'client_address' in locals() and client_address in clients:
-                clients.remove(client_address)
+            # Luôn trả lời: client đang chờ đúng request id này
+            log_debug(f"Error processing request {request_id}: {str(e)}")
+            msg_type, response, flags = MSG_ERROR, encode_json({"error": str(e)}), 0
+    write_frame(writer, response, request_id, msg_type, flags)
+    await writer.drain()
+
+
+async def handle_client_async(reader, writer, executor, limit):
+    addr = writer.get_extra_info("peername")
+    log_debug(f"[NEW CONNECTION] {addr}")
+    in_flight = asyncio.Semaphore(MAX_IN_FLIGHT_PER_CONNECTION)
+    tasks = set()
+    loop = asyncio.get_running_loop()
+
+    queued_pushes = threading.BoundedSemaphore(PUSH_QUEUE_SIZE)
+
+    def write_push(body):
+        queued_pushes.release()
+        write_frame(writer, body, 0, MSG_PUSH)
+
+    def push(body):
+        # LiveHub gọi từ thread riêng: chuyển việc ghi về event loop.
+        # Push không chờ drain(), nên hàng đợi hay buffer ghi đầy nghĩa là client không đọc: hủy đăng ký
+        if writer.transport.get_write_buffer_size() > PUSH_BUFFER_LIMIT or not queued_pushes.acquire(blocking=False):
+            raise ConnectionError("push queue full")
+        loop.call_soon_threadsafe(write_push, body)
+
+    session = ClientSession(addr, push)
+
+    def finished(task):
+        in_flight.release()
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log_debug(f"Error answering {addr}: {task.exception()}")
+
+    try:
+        while True:
+            frame = await read_frame_async(reader, MAX_REQUEST_SIZE)
+            if frame is None:
+                break
+
+            request_id, msg_type, _, payload = frame
+            if msg_type != MSG_REQUEST:
+                log_debug(f"Unexpected message type {msg_type} from {addr}")
+                continue
+
+            await in_flight.acquire()
+            task = asyncio.create_task(respond_async(writer, executor, limit, session, request_id, payload))
+            tasks.add(task)
+            task.add_done_callback(finished)
+    except ProtocolError as e:
+        log_debug(f"Protocol error from {addr}: {str(e)}")
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    except Exception as e:
+        log_debug(f"Error handling client {addr}: {str(e)}")
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        live_hub.unsubscribe_all(session)
+        writer.close()
+        log_debug(f"[DISCONNECTED] {addr}")
+
+
+async def serve_async(host=HOST, port=PORT, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="upstream")
+    limit = asyncio.Semaphore(max_concurrency)
+    server = await asyncio.start_server(
+        lambda r, w: handle_client_async(r, w, executor, limit),
+        host, port, reuse_address=True, backlog=ASYNC_BACKLOG)
+    print(f"[LISTENING] Async server on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def run_async_server(host=HOST, port=PORT, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    asyncio.run(serve_async(host, port, max_concurrency))
+
+
+# ---------- UDP Server ----------
+CHAT_PORT = 12345
+CHAT_HISTORY_DB = "chat_history.db"
+
+
+def run_udp_server():
+    relay = ChatRelay(HOST, CHAT_PORT, history=ChatHistoryStore(CHAT_HISTORY_DB))
+    print("UDP Chat Server đang chạy...")
+    relay.serve_forever()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Football Data Server")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="serve TCP clients from one asyncio event loop instead of one thread each")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="upstream requests in flight at once (async mode)")
+    args = parser.parse_args()
+
     print("[STARTING] Football Data Server is starting...")
+    warm_start()
+    prefetcher.start()
 
     # Tạo một event để kiểm soát việc dừng server
     exit_event = threading.Event()
 
-    tcp_thread = threading.Thread(target=run_server, daemon=True)
+    if args.use_async:
+        tcp_thread = threading.Thread(target=run_async_server,
+                                      args=(HOST, PORT, args.max_concurrency), daemon=True)
+    else:
+        tcp_thread = threading.Thread(target=run_server, daemon=True)
     udp_thread = threading.Thread(target=run_udp_server, daemon=True)
     tcp_thread.start()
     udp_thread.start()
@@ -0,0 +1,329 @@
+import heapq
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+# Nhóm trạng thái mà client lọc theo (combobox Status)
+STATUS_GROUPS = {
+    "LIVE": {"IN_PLAY", "PAUSED", "LIVE"},
+    "FINISHED": {"FINISHED", "AWARDED"},
+    "SCHEDULED": {"SCHEDULED", "TIMED"},
+}
+UPCOMING_STATUSES = STATUS_GROUPS["SCHEDULED"] | STATUS_GROUPS["LIVE"]
+
+
+def parse_cursor(cursor):
+    utc_date, _, match_id = cursor.rpartition("_")
+    return utc_date, int(match_id)
+
+
+def date_range(date_from, date_to):
+    """(low, high) sort keys covering two YYYY-MM-DD dates, both inclusive"""
+    return (date_from, -1), (date_to + "\uffff", -1)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _remove_key(keys, key):
+    index = bisect_left(keys, key)
+    if index < len(keys) and keys[index] == key:
+        del keys[index]
+
+
+# ---------- Compact Records ----------
+class MatchRecord:
+    __slots__ = ("id", "competition_id", "utc_date", "status", "matchday", "stage",
+                 "home_id", "away_id", "home_score", "away_score")
+
+    def __init__(self, match):
+        score = (match.get("score") or {}).get("fullTime") or {}
+        self.id = match["id"]
+        self.competition_id = str(match["competition"]["id"])
+        self.utc_date = match.get("utcDate", "")
+        self.status = _intern(match.get("status"))
+        self.matchday = match.get("matchday")
+        self.stage = _intern(match.get("stage"))
+        self.home_id = (match.get("homeTeam") or {}).get("id")
+        self.away_id = (match.get("awayTeam") or {}).get("id")
+        self.home_score = score.get("home")
+        self.away_score = score.get("away")
+
+    @property
+    def key(self):
+        return self.utc_date, self.id
+
+
+class TeamRecord:
+    __slots__ = ("id", "name", "short_name", "tla")
+
+    def __init__(self, team):
+        self.id = team["id"]
+        self.name = team.get("name") or ""
+        self.short_name = team.get("shortName")
+        self.tla = team.get("tla")
+
+    def update(self, team):
+        # Team lồng trong match chỉ có vài trường: không ghi đè giá trị đã biết bằng None
+        for attr, field in (("name", "name"), ("short_name", "shortName"), ("tla", "tla")):
+            if team.get(field):
+                setattr(self, attr, team[field])
+
+
+class PlayerRecord:
+    __slots__ = ("id", "name", "position", "nationality", "team_id")
+
+    def __init__(self, player, team_id=None):
+        self.id = player["id"]
+        self.name = player.get("name") or ""
+        self.position = _intern(player.get("position"))
+        self.nationality = _intern(player.get("nationality"))
+        self.team_id = team_id
+
+
+class FootballStore:
+    """Normalized in-memory index of matches, teams and players fed by upstream responses"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.competitions = {}  # competition id -> name
+        self.matches = {}  # match id -> MatchRecord
+        self.by_competition = {}  # competition id -> sorted [(utcDate, match id)]
+        self.by_team = {}  # team id -> sorted [(utcDate, match id)]
+        self.by_date = []  # sorted [(utcDate, match id)] của mọi giải
+        self.by_status = {}  # status -> set(match id)
+        self.teams = {}  # team id -> TeamRecord
+        self.team_names = {}  # tên / tên ngắn / TLA viết thường -> team id
+        self.players = {}  # player id -> PlayerRecord
+        self.squads = {}  # team id -> set(player id)
+
+    # ---------- Ingest ----------
+    def ingest(self, resource, data):
+        """Index an upstream response of the given resource type"""
+        if not isinstance(data, dict):
+            return
+        with self.lock:
+            if resource == "matches":
+                for match in data.get("matches", []):
+                    self._add_match(match)
+            elif resource == "standings":
+                self._add_competition(data.get("competition"))
+                for standing in data.get("standings", []):
+                    for row in standing.get("table", []):
+                        self._add_team(row.get("team"))
+            elif resource == "scorers":
+                self._add_competition(data.get("competition"))
+                for scorer in data.get("scorers", []):
+                    self._add_player(scorer.get("player"), self._add_team(scorer.get("team")))
+            elif resource == "team":
+                team_id = self._add_team(data)
+                if team_id is not None and "squad" in data:
+                    # Squad mới thay thế hoàn toàn squad cũ (cầu thủ đã chuyển đi)
+                    for player_id in self.squads.pop(team_id, set()):
+                        player = self.players.get(player_id)
+                        if player is not None and player.team_id == team_id:
+                            player.team_id = None
+                    for player in data["squad"]:
+                        self._add_player(player, team_id)
+            elif resource == "person":
+                self._add_player(data, self._add_team(data.get("currentTeam")))
+
+    def _add_competition(self, competition):
+        if competition and competition.get("id") is not None:
+            self.competitions[str(competition["id"])] = competition.get("name")
+
+    def _add_team(self, team):
+        if not team or team.get("id") is None:
+            return None
+        record = self.teams.get(team["id"])
+        if record is None:
+            record = self.teams[team["id"]] = TeamRecord(team)
+        else:
+            record.update(team)
+        for name in (record.name, record.short_name, record.tla):
+            if name:
+                self.team_names[name.lower()] = record.id
+        return record.id
+
+    def _add_player(self, player, team_id):
+        if not player or player.get("id") is None:
+            return
+        previous = self.players.get(player["id"])
+        if previous is not None:
+            if team_id is None:
+                team_id = previous.team_id
+            elif previous.team_id not in (None, team_id):
+                self.squads.get(previous.team_id, set()).discard(previous.id)
+        self.players[player["id"]] = PlayerRecord(player, team_id)
+        if team_id is not None:
+            self.squads.setdefault(team_id, set()).add(player["id"])
+
+    def _add_match(self, match):
+        if match.get("id") is None or (match.get("competition") or {}).get("id") is None:
+            return
+        self._add_competition(match["competition"])
+        self._add_team(match.get("homeTeam"))
+        self._add_team(match.get("awayTeam"))
+        record = MatchRecord(match)
+
+        previous = self.matches.get(record.id)
+        self.matches[record.id] = record
+        if previous is not None and previous.status != record.status:
+            self.by_status.get(previous.status, set()).discard(record.id)
+        self.by_status.setdefault(record.status, set()).add(record.id)
+        if previous is not None:
+            if (previous.key == record.key and previous.competition_id == record.competition_id
+                    and (previous.home_id, previous.away_id) == (record.home_id, record.away_id)):
+                return  # Chỉ đổi tỉ số/trạng thái: các chỉ mục vẫn đúng
+            self._unindex(previous)
+        insort(self.by_competition.setdefault(record.competition_id, []), record.key)
+        insort(self.by_date, record.key)
+        for team_id in (record.home_id, record.away_id):
+            if team_id is not None:
+                insort(self.by_team.setdefault(team_id, []), record.key)
+
+    def _unindex(self, record):
+        _remove_key(self.by_competition.get(record.competition_id, []), record.key)
+        _remove_key(self.by_date, record.key)
+        for team_id in (record.home_id, record.away_id):
+            if team_id is not None:
+                _remove_key(self.by_team.get(team_id, []), record.key)
+
+    # ---------- Queries ----------
+    def match_dict(self, record):
+        """Rebuild an upstream-shaped match object from a record"""
+        return {
+            "id": record.id,
+            "utcDate": record.utc_date,
+            "status": record.status,
+            "matchday": record.matchday,
+            "stage": record.stage,
+            "homeTeam": self.team_ref(record.home_id),
+            "awayTeam": self.team_ref(record.away_id),
+            "score": {"fullTime": {"home": record.home_score, "away": record.away_score}},
+            "competition": {"id": record.competition_id, "name": self.competitions.get(record.competition_id)},
+        }
+
+    def team_ref(self, team_id):
+        team = self.teams.get(team_id)
+        if team is None:
+            return {"id": team_id, "name": None}
+        return {"id": team.id, "name": team.name, "shortName": team.short_name, "tla": team.tla}
+
+    def has_competition(self, comp_id):
+        with self.lock:
+            return bool(self.by_competition.get(str(comp_id)))
+
+    def query(self, comp_ids, date_from, date_to, statuses=None, team_id=None, limit=None, cursor=None):
+        """Matches of `comp_ids` between two dates, one page at a time; returns (page, next_cursor)"""
+        if limit is not None and limit < 1:
+            raise ValueError(f"Page limit must be at least 1, got {limit}")
+        low, high = date_range(date_from, date_to)
+        if cursor:
+            low = max(low, parse_cursor(cursor))
+
+        comp_ids = {str(comp_id) for comp_id in comp_ids}
+        with self.lock:
+            if team_id is not None:
+                # Chỉ mục theo đội nhỏ hơn nhiều so với cả giải: quét nó rồi lọc theo giải
+                keys = self.by_team.get(team_id, [])
+                records = [self.matches[match_id]
+                           for _, match_id in keys[bisect_right(keys, low):bisect_left(keys, high)]]
+                records = [record for record in records if record.competition_id in comp_ids]
+            elif statuses is not None and self._status_count(statuses) < self._range_count(comp_ids, low, high):
+                # Trạng thái hiếm (vd. đang đá): đi từ chỉ mục trạng thái thay vì quét cả khoảng ngày
+                records = [self.matches[match_id] for status in statuses for match_id in self.by_status.get(status, ())]
+                records = sorted((record for record in records
+                                  if record.competition_id in comp_ids and low < record.key < high),
+                                 key=lambda record: record.key)
+            else:
+                ranges = []
+                for comp_id in comp_ids:
+                    keys = self.by_competition.get(comp_id, [])
+                    # bisect_right với cursor để bỏ qua chính trận cuối của trang trước
+                    ranges.append(keys[bisect_right(keys, low):bisect_left(keys, high)])
+                records = [self.matches[match_id] for _, match_id in heapq.merge(*ranges)]
+            if statuses is not None:
+                records = [record for record in records if record.status in statuses]
+
+            next_cursor = None
+            if limit is not None and len(records) > limit:
+                records = records[:limit]
+                next_cursor = f"{records[-1].utc_date}_{records[-1].id}"
+            return [self.match_dict(record) for record in records], next_cursor
+
+    def _status_count(self, statuses):
+        return sum(len(self.by_status.get(status, ())) for status in statuses)
+
+    def _range_count(self, comp_ids, low, high):
+        total = 0
+        for comp_id in comp_ids:
+            keys = self.by_competition.get(comp_id, [])
+            total += bisect_left(keys, high) - bisect_right(keys, low)
+        return total
+
+    def matches_between(self, date_from, date_to, statuses=None):
+        """Matches of every competition between two dates (inclusive), sorted by kickoff"""
+        low, high = date_range(date_from, date_to)
+        with self.lock:
+            records = [self.matches[match_id]
+                       for _, match_id in self.by_date[bisect_left(self.by_date, low):bisect_left(self.by_date, high)]]
+            return [self.match_dict(record) for record in records
+                    if statuses is None or record.status in statuses]
+
+    def teams_playing_between(self, date_from, date_to):
+        """Ids of teams with a match of any competition between two dates (inclusive)"""
+        low, high = date_range(date_from, date_to)
+        with self.lock:
+            team_ids = set()
+            for _, match_id in self.by_date[bisect_left(self.by_date, low):bisect_left(self.by_date, high)]:
+                record = self.matches[match_id]
+                team_ids.update(team_id for team_id in (record.home_id, record.away_id) if team_id is not None)
+            return team_ids
+
+    def in_play(self, comp_id, since, until):
+        """True if a match of the competition is live, or kicked off between two ISO timestamps"""
+        comp_id = str(comp_id)
+        with self.lock:
+            for status in STATUS_GROUPS["LIVE"]:
+                if any(self.matches[match_id].competition_id == comp_id
+                       for match_id in self.by_status.get(status, ())):
+                    return True
+            keys = self.by_competition.get(comp_id, [])
+            return bisect_left(keys, (until, -1)) > bisect_left(keys, (since, -1))
+
+    def find_team(self, name_or_id):
+        """Resolve a team id from its id, name, short name or TLA (case-insensitive)"""
+        name_or_id = str(name_or_id)
+        with self.lock:
+            if name_or_id.isdigit() and int(name_or_id) in self.teams:
+                return int(name_or_id)
+            return self.team_names.get(name_or_id.lower())
+
+    def next_fixture(self, team_id, today):
+        """First scheduled or live match of a team from `today` (YYYY-MM-DD) on"""
+        with self.lock:
+            keys = self.by_team.get(team_id, [])
+            for _, match_id in keys[bisect_left(keys, (today, -1)):]:
+                record = self.matches[match_id]
+                if record.status in UPCOMING_STATUSES:
+                    return self.match_dict(record)
+            return None
+
+    def team_players(self, team_id):
+        """Players indexed for a team, sorted by name"""
+        with self.lock:
+            players = sorted((self.players[player_id] for player_id in self.squads.get(team_id, ())),
+                             key=lambda player: player.name)
+            return [{"id": p.id, "name": p.name, "position": p.position, "nationality": p.nationality}
+                    for p in players]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "competitions": len(self.competitions),
+                "matches": len(self.matches),
+                "teams": len(self.teams),
+                "players": len(self.players),
+            }